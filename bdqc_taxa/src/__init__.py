@@ -22,6 +22,8 @@ from . import cdpnq
 from . import natureserve
 from . import atlas_utils
 from . import cache
+from . import transport
+from . import deadline
 
 __all__ = [
     "__title__",
@@ -40,5 +42,7 @@ __all__ = [
     "cdpnq",
     "natureserve",
     "atlas_utils",
-    "cache"
+    "cache",
+    "transport",
+    "deadline"
 ]
\ No newline at end of file
@@ -10,10 +10,11 @@
 # authorship: Auteur obtenu de Noms latins accept�s
 
 
-import sqlite3
 import importlib.resources
 import os.path
 
+from .custom_sources import connection
+
 # Get the database file from the package data
 DB_FILE = 'custom_sources.sqlite'
 
@@ -32,8 +33,8 @@ if not os.path.exists(db_path):
     except (ImportError, FileNotFoundError):
         raise FileNotFoundError(f"Could not locate {DB_FILE} in package data")
 
-# Connect to the database
-conn = sqlite3.connect(db_path)
+# Connect to the database, see `custom_sources.connection`
+conn = connection(db_path)
 
 def match_taxa(species) -> dict:
     """Match a species name to the Bryoquel database
@@ -59,7 +60,7 @@ def match_taxa(species) -> dict:
         - vernacular_name_en: Noms anglais accept�s
     """
     # Get the cursor
-    c = conn.cursor()
+    c = connection(db_path).cursor()
     
     # Get the species name
     species = species.strip()
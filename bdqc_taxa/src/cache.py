@@ -4,35 +4,892 @@ Cache management module for bdqc_taxa.
 Provides diskcache-based caching for API calls with storage in the user's
 platform-appropriate cache directory (appdata).
 
+The cache is sharded (`diskcache.FanoutCache`, `CACHE_SHARDS` SQLite files)
+so that many processes, e.g. PL/Python backends, can write to it at once.
+With BDQC_TAXA_CACHE_PER_NAMESPACE set, each source namespace (gbif,
+global_names, wikidata) also gets its own sharded cache.
+
+Caches are opened on first use, in BDQC_TAXA_CACHE_DIR (default: the user
+cache directory) with BDQC_TAXA_CACHE_SIZE_LIMIT and
+BDQC_TAXA_CACHE_EVICTION_POLICY, or the settings given to `configure()`
+before that.
+
+Large values are stored compressed (`CompressedDisk`), with zstd when the
+zstandard package is installed (`pip install bdqc_taxa[fast]`) and
+BDQC_TAXA_CACHE_COMPRESSION=zstd, zlib otherwise.
+
 Usage:
-    from bdqc_taxa.cache import cache, clear_cache, get_cache_path
+    from bdqc_taxa.cache import cache, memoize, clear_cache, get_cache_path
 
     # Use cache decorator on functions
-    @cache.memoize()  # Cache without expiration
+    @memoize()  # Cache without expiration
     def my_cached_function(arg1: str, arg2: str) -> dict:
         ...
 
+    # Keep "not found" answers for NEGATIVE_EXPIRE seconds only
+    @memoize(negative=lambda resp: not resp['results'])
+    def my_search(query: str) -> dict:
+        ...
+
+    # Refresh GBIF answers older than a week, in the background
+    set_source_policy("gbif", ttl=7 * 24 * 3600)
+
+    # Hits per tier (in-process memory, disk) of a memoized function
+    my_cached_function.cache_info()
+
+    # Counters of all memoized functions and namespaces, disk usage
+    reset_cache_stats()
+    ...
+    stats = get_cache_stats()
+
     # Clear all cached data
     clear_cache()
 
     # Get cache directory path
     path = get_cache_path()
+
+    # Warm a new host from the cache of another one
+    export_snapshot("taxa_cache.snapshot", namespaces=["gbif", "global_names"])
+    import_snapshot("taxa_cache.snapshot")
+
+    # Pre-populate the cache before a refresh
+    warm(["Acer saccharum", "Picea mariana"], concurrency=8)
+
+Command line:
+    bdqc-taxa-cache warm names.txt --sources gbif global_names
+    bdqc-taxa-cache info
+    bdqc-taxa-cache export taxa_cache.snapshot --namespaces gbif
+    bdqc-taxa-cache import taxa_cache.snapshot
 """
 
+import argparse
+import gzip
+import hashlib
+import json
 import os
+import sys
+import pickle
 import shutil
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from concurrent import futures
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, List, Optional
 import platformdirs
-from diskcache import Cache
+from diskcache import Cache, Disk, FanoutCache
+from diskcache.core import ENOVAL, EVICTION_POLICY, UNKNOWN, args_to_key, full_name
 import functools
 
-# Cache directory in user's platform-appropriate cache location
-CACHE_DIR = Path(platformdirs.user_cache_dir("bdqc_taxa"))
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
+from .deadline import DeadlineExceeded
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Cache directory in user's platform-appropriate cache location, created
+# when the cache is first used
+CACHE_DIR = Path(os.environ.get("BDQC_TAXA_CACHE_DIR")
+                 or platformdirs.user_cache_dir("bdqc_taxa"))
+
+# Maximum size in bytes of each disk cache (split across its shards) and
+# diskcache eviction policy applied when it is reached. "least-recently-used"
+# and "least-frequently-used" write on every read.
+CACHE_SIZE_LIMIT = int(os.environ.get("BDQC_TAXA_CACHE_SIZE_LIMIT", 2 ** 30))
+CACHE_EVICTION_POLICY = os.environ.get(
+    "BDQC_TAXA_CACHE_EVICTION_POLICY", "least-recently-stored")
+
+# Seconds "not found" answers are kept in the negative cache
+NEGATIVE_EXPIRE = float(os.environ.get("BDQC_TAXA_NEGATIVE_EXPIRE", 3600))
+
+# Bounds of the in-process memory tier placed in front of the disk cache
+MEMORY_MAX_ENTRIES = int(os.environ.get("BDQC_TAXA_MEMORY_MAX_ENTRIES", 10000))
+MEMORY_MAX_BYTES = int(os.environ.get("BDQC_TAXA_MEMORY_MAX_BYTES", 64 * 1024 * 1024))
+
+# Default freshness of cached source answers, in seconds. Answers older than
+# the TTL are served while refreshed in the background; answers older than
+# the max age are refreshed before being returned. Overridden per namespace
+# with `set_source_policy` or BDQC_TAXA_<NAMESPACE>_TTL / _MAX_AGE, e.g.
+# BDQC_TAXA_GBIF_TTL. "none" disables the limit.
+SOURCE_TTL = 30 * 24 * 3600
+SOURCE_MAX_AGE = 365 * 24 * 3600
+
+# Cache finished `TaxaRef.from_all_sources` and `Vernacular.from_match`
+# results ("results" namespace), on top of the source answers
+RESULT_CACHE = os.environ.get("BDQC_TAXA_RESULT_CACHE", "").lower() in ("1", "true", "yes")
+
+# Background refreshes of stale answers
+REFRESH_WORKERS = 4
+REFRESH_MAX_PENDING = 256
+
+# Number of SQLite shards of each disk cache, 1 for a single unsharded file
+CACHE_SHARDS = int(os.environ.get("BDQC_TAXA_CACHE_SHARDS", 8))
+
+# Seconds a shard operation waits for the SQLite lock held by another
+# process before retrying
+CACHE_TIMEOUT = float(os.environ.get("BDQC_TAXA_CACHE_TIMEOUT", 1.0))
+
+# One disk cache per source namespace, see `get_namespace_cache`
+CACHE_PER_NAMESPACE = os.environ.get(
+    "BDQC_TAXA_CACHE_PER_NAMESPACE", "").lower() in ("1", "true", "yes")
+
+# Compression of stored values: "zstd", "zlib" or "none". zstd falls back
+# to zlib if the zstandard package is not installed.
+CACHE_COMPRESSION = os.environ.get("BDQC_TAXA_CACHE_COMPRESSION", "zlib").lower()
+
+# Pickled values smaller than this many bytes are stored uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get("BDQC_TAXA_CACHE_COMPRESS_MIN_SIZE", 1024))
+
+# Prefix of compressed values, by algorithm
+_COMPRESSED_PREFIXES = {"zlib": b"BDQCZL", "zstd": b"BDQCZS"}
+
+_compression_stats = Counter()
+_compression_lock = threading.Lock()
+
+
+def _compression() -> Optional[str]:
+    """Compression algorithm in use, None if disabled."""
+    if CACHE_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd"
+    if CACHE_COMPRESSION in ("zstd", "zlib"):
+        return "zlib"
+    return None
+
+
+class CompressedDisk(Disk):
+    """
+    diskcache `Disk` storing pickled values of `COMPRESS_MIN_SIZE` bytes or
+    more compressed. Uncompressed values, e.g. written by previous versions,
+    are read as is.
+    """
+    def store(self, value, read, key=UNKNOWN):
+        algorithm = _compression()
+        if not read and algorithm is not None \
+                and type(value) not in (str, bytes, int, float):
+            data = pickle.dumps(value, protocol=self.pickle_protocol)
+            if len(data) >= COMPRESS_MIN_SIZE:
+                if algorithm == "zstd":
+                    packed = zstandard.ZstdCompressor().compress(data)
+                else:
+                    packed = zlib.compress(data)
+                if len(packed) < len(data):
+                    with _compression_lock:
+                        _compression_stats["values"] += 1
+                        _compression_stats["raw_bytes"] += len(data)
+                        _compression_stats["stored_bytes"] += len(packed)
+                    value = _COMPRESSED_PREFIXES[algorithm] + packed
+        return super().store(value, read, key=key)
+
+    def fetch(self, mode, filename, value, read):
+        value = super().fetch(mode, filename, value, read)
+        if type(value) is bytes:
+            prefix = value[:6]
+            if prefix == _COMPRESSED_PREFIXES["zlib"]:
+                return pickle.loads(zlib.decompress(value[6:]))
+            if prefix == _COMPRESSED_PREFIXES["zstd"]:
+                if zstandard is None:
+                    raise ImportError("zstandard is required to read this cache entry")
+                return pickle.loads(zstandard.ZstdDecompressor().decompress(value[6:]))
+        return value
+
+
+def _open_cache(directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    settings = {"timeout": CACHE_TIMEOUT, "disk": CompressedDisk,
+                "size_limit": CACHE_SIZE_LIMIT,
+                "eviction_policy": CACHE_EVICTION_POLICY}
+    if CACHE_SHARDS <= 1:
+        return Cache(directory=str(directory), **settings)
+    return FanoutCache(directory=str(directory), shards=CACHE_SHARDS, **settings)
+
+
+class LazyCache:
+    """
+    Disk cache opened on first use, under `CACHE_DIR` / `subdir`.
+
+    Attributes and the mapping protocol are forwarded to the underlying
+    `Cache` or `FanoutCache`, so that importing the package has no
+    filesystem side effect and `configure` can still change the settings.
+    """
+    def __init__(self, subdir: Optional[str] = None):
+        self.subdir = subdir
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return CACHE_DIR / self.subdir if self.subdir else CACHE_DIR
+
+    @property
+    def is_open(self) -> bool:
+        return self._store is not None
+
+    def open(self):
+        """Return the underlying cache, opening it if needed."""
+        store = self._store
+        if store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = _open_cache(self.path)
+                store = self._store
+        return store
+
+    def close(self) -> None:
+        """Close the underlying cache, reopened on next use."""
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+
+    def __getattr__(self, name):
+        return getattr(self.open(), name)
+
+    def __contains__(self, key):
+        return key in self.open()
+
+    def __getitem__(self, key):
+        return self.open()[key]
+
+    def __setitem__(self, key, value):
+        self.open()[key] = value
+
+    def __delitem__(self, key):
+        del self.open()[key]
+
+    def __iter__(self):
+        return iter(self.open())
+
+    def __len__(self):
+        return len(self.open())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({str(self.path)!r})"
+
 
 # Disk cache instance for persistent, durable caching
-cache = Cache(directory=str(CACHE_DIR))
+cache = LazyCache()
+
+# Separate store for short-lived "not found" answers, see `memoize`
+negative_cache = LazyCache("negative")
+
+_namespace_caches = {}
+_namespace_lock = threading.Lock()
+
+
+def configure(directory=None, size_limit: Optional[int] = None,
+              eviction_policy: Optional[str] = None, shards: Optional[int] = None,
+              timeout: Optional[float] = None,
+              per_namespace: Optional[bool] = None) -> dict:
+    """
+    Set the location and capacity of the disk caches, overriding the
+    BDQC_TAXA_CACHE_* environment variables.
+
+    Meant to be called before the cache is first used: caches already open
+    are closed and reopened with the new settings on next use.
+
+    Args:
+        directory: Cache directory (`CACHE_DIR`).
+        size_limit: Maximum size in bytes of each disk cache
+            (`CACHE_SIZE_LIMIT`).
+        eviction_policy: diskcache eviction policy (`CACHE_EVICTION_POLICY`).
+        shards: Number of shards (`CACHE_SHARDS`).
+        timeout: SQLite lock timeout in seconds (`CACHE_TIMEOUT`).
+        per_namespace: One cache per source namespace (`CACHE_PER_NAMESPACE`).
+
+    Arguments left to None keep their current value.
+
+    Returns the previous settings, as keyword arguments restoring them.
+    """
+    global CACHE_DIR, CACHE_SIZE_LIMIT, CACHE_EVICTION_POLICY, CACHE_SHARDS, \
+        CACHE_TIMEOUT, CACHE_PER_NAMESPACE
+    if eviction_policy is not None and eviction_policy not in EVICTION_POLICY:
+        raise ValueError(f"Unknown eviction policy: {eviction_policy}")
+    previous = dict(directory=CACHE_DIR, size_limit=CACHE_SIZE_LIMIT,
+                    eviction_policy=CACHE_EVICTION_POLICY, shards=CACHE_SHARDS,
+                    timeout=CACHE_TIMEOUT, per_namespace=CACHE_PER_NAMESPACE)
+    for store in [cache, negative_cache, *_namespace_caches.values()]:
+        store.close()
+    if directory is not None:
+        CACHE_DIR = Path(directory)
+    if size_limit is not None:
+        CACHE_SIZE_LIMIT = int(size_limit)
+    if eviction_policy is not None:
+        CACHE_EVICTION_POLICY = eviction_policy
+    if shards is not None:
+        CACHE_SHARDS = int(shards)
+    if timeout is not None:
+        CACHE_TIMEOUT = float(timeout)
+    if per_namespace is not None:
+        CACHE_PER_NAMESPACE = bool(per_namespace)
+    memory_cache.clear()
+    return previous
+
+# Namespace of each memoized function, by its full name (first key item)
+_function_namespaces = {}
+
+
+def get_namespace_cache(namespace: Optional[str]):
+    """
+    Return the disk cache holding the answers of a source namespace: its own
+    cache if `CACHE_PER_NAMESPACE` is set, else the shared `cache`.
+    """
+    if not CACHE_PER_NAMESPACE or namespace is None:
+        return cache
+    with _namespace_lock:
+        if namespace not in _namespace_caches:
+            _namespace_caches[namespace] = LazyCache(f"namespaces/{namespace}")
+        return _namespace_caches[namespace]
+
+
+def _all_caches() -> list:
+    """Shared caches and the namespace caches found on disk."""
+    stores = [cache, negative_cache]
+    # Unsharded cache written by previous versions
+    if CACHE_SHARDS > 1 and (CACHE_DIR / "cache.db").exists():
+        stores.append(Cache(directory=str(CACHE_DIR), timeout=CACHE_TIMEOUT))
+    namespaces_dir = CACHE_DIR / "namespaces"
+    if namespaces_dir.is_dir():
+        for path in namespaces_dir.iterdir():
+            if path.is_dir():
+                with _namespace_lock:
+                    if path.name not in _namespace_caches:
+                        _namespace_caches[path.name] = LazyCache(f"namespaces/{path.name}")
+    with _namespace_lock:
+        return stores + list(_namespace_caches.values())
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by entries and bytes.
+
+    Values are kept pickled: a hit costs an unpickle but no file lock or SQL
+    query, and callers can't alter the cached value by mutating the result.
+
+    Args:
+        max_entries: Maximum number of entries, None for no limit.
+        max_bytes: Maximum total size of the pickled values, None for no
+            limit.
+    """
+    def __init__(self, max_entries: Optional[int] = MEMORY_MAX_ENTRIES,
+                 max_bytes: Optional[int] = MEMORY_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        # Evictions per tag
+        self.evicted = Counter()
+        # {key: (tag, pickled value, expire time or None)}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        key = _hashable(key)
+        with self._lock:
+            try:
+                _, data, expire_time = self._data[key]
+            except KeyError:
+                return default
+            if expire_time is not None and expire_time <= time.time():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, value, expire: Optional[float] = None, tag=None) -> int:
+        """Store `value`, returning its pickled size in bytes."""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        key = _hashable(key)
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            # Too large to keep, but the previous value is outdated
+            with self._lock:
+                self._pop(key)
+            return len(data)
+        expire_time = time.time() + expire if expire is not None else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (tag, data, expire_time)
+            self.size_bytes += len(data)
+            while self._data and (
+                    (self.max_entries is not None and len(self._data) > self.max_entries) or
+                    (self.max_bytes is not None and self.size_bytes > self.max_bytes)):
+                evicted_key = next(iter(self._data))
+                self.evicted[self._data[evicted_key][0]] += 1
+                self._pop(evicted_key)
+                self.evictions += 1
+        return len(data)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._pop(_hashable(key))
+
+    def evict(self, tag) -> None:
+        """Remove the entries stored with `tag`."""
+        with self._lock:
+            for key in [k for k, v in self._data.items() if v[0] == tag]:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.evictions = 0
+            self.evicted.clear()
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+
+class CacheStats:
+    """
+    Thread-safe counters of a memoized function, see `get_cache_stats`.
+    """
+    FIELDS = ("memory_hits", "disk_hits", "misses", "stale_hits", "sets", "set_bytes")
+
+    def __init__(self, name: str, namespace: Optional[str] = None):
+        self.name = name
+        self.namespace = namespace
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+        self._lock = threading.Lock()
+
+    def incr(self, field: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[field] += amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def as_dict(self) -> dict:
+        """
+        Counters, with `evictions` from the memory tier and the derived
+        `hits`, `hit_ratio` and `avg_value_size` (mean pickled size in bytes
+        of the stored values).
+        """
+        with self._lock:
+            out = dict(self._counts)
+        out["evictions"] = memory_cache.evicted[(self.name,)]
+        return _derived_stats(out)
+
+
+def _derived_stats(counts: dict) -> dict:
+    counts["hits"] = counts["memory_hits"] + counts["disk_hits"]
+    lookups = counts["hits"] + counts["misses"]
+    counts["hit_ratio"] = counts["hits"] / lookups if lookups else 0.0
+    counts["avg_value_size"] = counts["set_bytes"] / counts["sets"] if counts["sets"] else 0.0
+    return counts
+
+
+# Counters of the memoized functions, by full name
+_function_stats = {}
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing a key into a single execution.
+
+    The first caller of `do(key, func)` runs `func`; callers arriving with the
+    same key while it runs wait for it and get its result (or exception).
+    A leader running out of its own deadline doesn't fail its followers: they
+    call again, under their own deadline.
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func: Callable):
+        key = _hashable(key)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if isinstance(call.error, DeadlineExceeded):
+                return self.do(key, func)
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def _hashable(key):
+    try:
+        hash(key)
+        return key
+    except TypeError:
+        # Keys with dict arguments
+        return pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _env_seconds(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.strip().lower() in ("", "none", "never"):
+        return None
+    return float(value)
+
+
+_source_policies = {}
+
+
+def set_source_policy(namespace: str, ttl=ENOVAL, max_age=ENOVAL) -> None:
+    """
+    Set the freshness policy of a source namespace (e.g. "gbif").
+
+    Args:
+        namespace: Namespace given to `memoize`.
+        ttl: Seconds before cached answers are refreshed in the background,
+            None to never refresh them.
+        max_age: Seconds before cached answers are refreshed before being
+            returned, None for no limit.
+
+    Arguments left out keep their current value.
+    """
+    policy = get_source_policy(namespace)
+    if ttl is not ENOVAL:
+        policy["ttl"] = ttl
+    if max_age is not ENOVAL:
+        policy["max_age"] = max_age
+    _source_policies[namespace] = policy
+
+
+def get_source_policy(namespace: Optional[str]) -> dict:
+    """
+    Return the freshness policy of a source namespace as a dict with keys
+    `ttl` and `max_age`. Functions memoized without namespace never expire.
+    """
+    if namespace is None:
+        return {"ttl": None, "max_age": None}
+    if namespace in _source_policies:
+        return dict(_source_policies[namespace])
+    prefix = f"BDQC_TAXA_{namespace.upper()}"
+    return {
+        "ttl": _env_seconds(f"{prefix}_TTL",
+                            _env_seconds("BDQC_TAXA_TTL", SOURCE_TTL)),
+        "max_age": _env_seconds(f"{prefix}_MAX_AGE",
+                                _env_seconds("BDQC_TAXA_MAX_AGE", SOURCE_MAX_AGE)),
+    }
+
+
+def _age(stored_at) -> Optional[float]:
+    # Entries written by previous versions carry no timestamp
+    if not isinstance(stored_at, (int, float)):
+        return None
+    return time.time() - stored_at
+
+
+_refresh_executor = None
+_refresh_futures = set()
+_refresh_lock = threading.Lock()
+
+
+def _submit_refresh(job: Callable) -> bool:
+    """Run `job` in the refresh threads, False if too many are pending."""
+    global _refresh_executor
+    with _refresh_lock:
+        if len(_refresh_futures) >= REFRESH_MAX_PENDING:
+            return False
+        if _refresh_executor is None:
+            _refresh_executor = futures.ThreadPoolExecutor(
+                REFRESH_WORKERS, thread_name_prefix="bdqc_taxa_refresh")
+        future = _refresh_executor.submit(job)
+        _refresh_futures.add(future)
+    future.add_done_callback(_refresh_done)
+    return True
+
+
+def _refresh_done(future) -> None:
+    with _refresh_lock:
+        _refresh_futures.discard(future)
+
+
+def wait_for_refreshes(timeout: Optional[float] = None) -> bool:
+    """
+    Wait for the pending background refreshes.
+
+    Returns:
+        bool: True if all of them completed within `timeout` seconds.
+    """
+    with _refresh_lock:
+        pending = list(_refresh_futures)
+    _, not_done = futures.wait(pending, timeout)
+    return not not_done
+
+
+def normalize_name(name, capitalize: bool = True):
+    """
+    Canonical form of a name in cache keys: whitespace collapsed and, if
+    `capitalize`, first letter capitalized, as `TaxaRef.from_all_sources`
+    does. Non-string values are returned as is.
+    """
+    if not isinstance(name, str):
+        return name
+    name = " ".join(name.split())
+    if not capitalize:
+        return name
+    return name[:1].upper() + name[1:]
+
+
+# In-process tier checked before the disk cache, see `memoize`
+memory_cache = LRUCache()
+
+
+def memoize(negative: Optional[Callable] = None,
+            negative_expire: Optional[float] = None,
+            ignore: tuple = (),
+            single_flight: bool = True,
+            memory: bool = True,
+            namespace: Optional[str] = None,
+            normalize: Optional[Callable] = None,
+            cache_if: Optional[Callable] = None):
+    """
+    Decorator caching the return value of a function in the disk cache.
+
+    Lookups go first to the in-process `memory_cache` (LRU bounded by
+    `MEMORY_MAX_ENTRIES` and `MEMORY_MAX_BYTES`), then to the disk cache.
+    Disk hits are copied to the memory tier.
+
+    Unlike `cache.memoize()`, exceptions are never cached: a failed request
+    raises and the next call retries it. Return values for which `negative`
+    is true (e.g. "name not found" answers) go to `negative_cache`, where
+    they expire after `negative_expire` seconds (default `NEGATIVE_EXPIRE`),
+    so unknown names are not looked up repeatedly but still get picked up
+    once the source knows them.
+
+    Answers are stored with the time they were fetched. Past the TTL of the
+    function's `namespace` (see `set_source_policy`), a hit returns the cached
+    answer right away and refreshes it in a background thread
+    (stale-while-revalidate), without the keyword arguments in `ignore`
+    (e.g. the caller's deadline). Past the namespace's max age, the answer
+    is refreshed before being returned, falling back to the cached one if
+    the source fails.
+
+    Args:
+        negative: Predicate applied to a return value, True if it is an
+            empty answer.
+        negative_expire: Seconds before negative answers expire.
+        ignore: Positional indexes or keyword names left out of the key.
+        single_flight: If True, concurrent misses on the same key in this
+            process wait for one call instead of each calling the function.
+        memory: If False, skip the memory tier.
+        namespace: Source the answers come from, selecting the freshness
+            policy. Without one, answers never go stale.
+        normalize: Function mapping the call arguments `(*args, **kwargs)`
+            to their canonical `(args, kwargs)`, applied before computing the
+            key and calling the function, so equivalent calls (e.g. names
+            differing by whitespace) share a cache entry.
+        cache_if: Predicate applied to a return value, False if it must not
+            be stored (e.g. partial results).
+
+    The decorated function gets the attributes:
+        __cache_key__(*args, **kwargs): Cache key of a call.
+        get_cached(key, default=None): Cached value of a key, positive or
+            negative.
+        set_cached(key, value): Store a value as the function would.
+        cache_info(): Counters of the function as a dict, see
+            `CacheStats.as_dict`.
+    """
+    ignore = set(ignore)
+
+    def decorator(func):
+        base = (full_name(func),)
+        _function_namespaces[base[0]] = namespace
+        stats = _function_stats[base[0]] = CacheStats(base[0], namespace)
+        in_flight = SingleFlight()
+
+        def canonical(args, kwargs):
+            if normalize is None:
+                return args, kwargs
+            return normalize(*args, **kwargs)
+
+        def __cache_key__(*args, **kwargs):
+            args, kwargs = canonical(args, kwargs)
+            return args_to_key(base, args, kwargs, False, ignore)
+
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        def lookup(key):
+            """
+            Return `(value, counter, stored_at)`, value is ENOVAL on a miss.
+            """
+            if memory:
+                entry = memory_cache.get(key, ENOVAL)
+                if entry is not ENOVAL:
+                    stored_at, value = entry
+                    return value, "memory_hits", stored_at
+
+            # Positive answers are tagged with the time they were fetched
+            store = get_namespace_cache(namespace)
+            value, stored_at = store.get(key, default=ENOVAL, tag=True, retry=True)
+            expire = None
+            if value is ENOVAL:
+                value, expire_time = negative_cache.get(
+                    key, default=ENOVAL, expire_time=True, retry=True)
+                if expire_time is not None:
+                    expire = expire_time - time.time()
+                # Negative answers stay fresh until they expire
+                stored_at = time.time()
+            # Errors cached by previous versions are treated as misses
+            if value is ENOVAL or isinstance(value, BaseException):
+                return ENOVAL, "misses", None
+
+            if memory:
+                memory_cache.set(key, (stored_at, value), expire=expire, tag=base)
+            return value, "disk_hits", stored_at
+
+        def get_cached(key, default=None):
+            value, counter, _ = lookup(key)
+            stats.incr(counter)
+            return default if value is ENOVAL else value
+
+        def set_cached(key, value):
+            expire = None
+            stored_at = time.time()
+            if negative is not None and negative(value):
+                expire = negative_expire if negative_expire is not None \
+                    else NEGATIVE_EXPIRE
+                negative_cache.set(key, value, expire=expire, retry=True)
+                # A previous positive answer would still be found first
+                get_namespace_cache(namespace).delete(key, retry=True)
+            else:
+                get_namespace_cache(namespace).set(key, value, tag=stored_at, retry=True)
+                negative_cache.delete(key, retry=True)
+            if memory:
+                size = memory_cache.set(key, (stored_at, value), expire=expire, tag=base)
+            else:
+                size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            stats.incr("sets")
+            stats.incr("set_bytes", size)
+
+        def cache_info():
+            return stats.as_dict()
+
+        def load(key, args, kwargs, stale_at=None):
+            # Checked again, the previous leader may have just stored it
+            if single_flight:
+                value, _, stored_at = lookup(key)
+                if value is not ENOVAL and stored_at != stale_at:
+                    return value
+            value = func(*args, **kwargs)
+            if cache_if is None or cache_if(value):
+                set_cached(key, value)
+            return value
+
+        def fetch(key, args, kwargs, stale_at=None):
+            if single_flight:
+                return in_flight.do(key, lambda: load(key, args, kwargs, stale_at))
+            return load(key, args, kwargs, stale_at)
+
+        def refresh_later(key, args, kwargs, stale_at):
+            hkey = _hashable(key)
+            with refreshing_lock:
+                if hkey in refreshing:
+                    return
+                refreshing.add(hkey)
+
+            # Runs without the caller's context, hence without its deadline.
+            # Ignored keyword arguments don't change the answer and may only
+            # make sense for the caller (e.g. an absolute deadline).
+            kwargs = {k: v for k, v in kwargs.items() if k not in ignore}
+
+            def job():
+                try:
+                    fetch(key, args, kwargs, stale_at)
+                except Exception:
+                    pass  # Still stale, retried on a later hit
+                finally:
+                    with refreshing_lock:
+                        refreshing.discard(hkey)
+
+            if not _submit_refresh(job):
+                with refreshing_lock:
+                    refreshing.discard(hkey)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            args, kwargs = canonical(args, kwargs)
+            key = args_to_key(base, args, kwargs, False, ignore)
+            value, counter, stored_at = lookup(key)
+            stats.incr(counter)
+            if value is ENOVAL:
+                return fetch(key, args, kwargs)
+
+            policy = get_source_policy(namespace)
+            age = _age(stored_at)
+            if age is not None and policy["max_age"] is not None \
+                    and age > policy["max_age"]:
+                try:
+                    return fetch(key, args, kwargs, stored_at)
+                except Exception:
+                    return value
+            # Entries of unknown age are refreshed in the background
+            if policy["ttl"] is not None and (age is None or age > policy["ttl"]):
+                stats.incr("stale_hits")
+                refresh_later(key, args, kwargs, stored_at)
+            return value
+
+        wrapper.__cache_key__ = __cache_key__
+        wrapper.get_cached = get_cached
+        wrapper.set_cached = set_cached
+        wrapper.cache_info = cache_info
+        wrapper.cache_base = base
+        wrapper.namespace = namespace
+        wrapper.cache = get_namespace_cache(namespace)
+        return wrapper
+
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def result_key_config() -> tuple:
+    """
+    Library version and custom sources database digest, part of the keys of
+    cached results so that upgrades and database updates invalidate them.
+    The digest only depends on the content, so that reinstalls and snapshots
+    imported on other hosts still hit. Computed once per process.
+    """
+    from .__about__ import __version__
+    from . import bryoquel
+    digest = hashlib.sha256()
+    with open(bryoquel.db_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return (__version__, digest.hexdigest())
 
 
 def get_cache_path() -> Path:
@@ -52,35 +909,101 @@ def get_cache_info() -> dict:
     Returns:
         dict: Dictionary containing:
             - path: Cache directory path
-            - size_bytes: Total size of cache in bytes
+            - size_bytes: Total size of cache in bytes, as accounted by
+              diskcache (`volume()`)
             - size_mb: Total size of cache in megabytes
             - exists: Whether cache directory exists
+            - entries: Number of entries, summed over all shards and
+              namespace caches
+            - shards: Number of shards per disk cache
     """
     if not CACHE_DIR.exists():
         return {
             "path": str(CACHE_DIR),
             "size_bytes": 0,
             "size_mb": 0.0,
-            "exists": False
+            "exists": False,
+            "entries": 0,
+            "shards": CACHE_SHARDS
         }
 
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(CACHE_DIR):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            try:
-                total_size += os.path.getsize(filepath)
-            except OSError:
-                pass
-
+    # diskcache's own accounting, no directory walk
+    stores = _all_caches()
+    total_size = sum(store.volume() for store in stores)
     return {
         "path": str(CACHE_DIR),
         "size_bytes": total_size,
         "size_mb": round(total_size / (1024 * 1024), 2),
-        "exists": True
+        "exists": True,
+        "entries": sum(len(store) for store in stores),
+        "shards": CACHE_SHARDS
+    }
+
+
+def get_cache_stats() -> dict:
+    """
+    Return cache counters since the process started or `reset_cache_stats`.
+
+    Returns:
+        dict: Dictionary containing:
+            - functions: Counters of each memoized function, by full name
+              (hits per tier, misses, stale_hits, sets, evictions,
+              hit_ratio, avg_value_size, ...)
+            - namespaces: The same counters summed per source namespace
+              ("default" for functions without namespace)
+            - memory: Entries, bytes and evictions of the memory tier
+            - disk: Entries and volume (bytes) of the disk caches, from
+              diskcache's accounting
+            - compression: Algorithm, number of values compressed, their
+              pickled and stored sizes and the compression `ratio`
+              (pickled / stored bytes)
+            - pending_refreshes: Background refreshes not yet done
+    """
+    functions = {name: stats.as_dict() for name, stats in list(_function_stats.items())}
+    namespaces = {}
+    for name, stats in list(_function_stats.items()):
+        totals = namespaces.setdefault(
+            stats.namespace or "default", dict.fromkeys(CacheStats.FIELDS + ("evictions",), 0))
+        for field in totals:
+            totals[field] += functions[name][field]
+    stores = _all_caches()
+    with _refresh_lock:
+        pending_refreshes = len(_refresh_futures)
+    with _compression_lock:
+        compression = {field: _compression_stats[field]
+                       for field in ("values", "raw_bytes", "stored_bytes")}
+    compression["algorithm"] = _compression()
+    compression["ratio"] = compression["raw_bytes"] / compression["stored_bytes"] \
+        if compression["stored_bytes"] else 1.0
+    return {
+        "functions": functions,
+        "namespaces": {name: _derived_stats(totals) for name, totals in namespaces.items()},
+        "memory": {
+            "entries": len(memory_cache),
+            "size_bytes": memory_cache.size_bytes,
+            "evictions": memory_cache.evictions
+        },
+        "disk": {
+            "entries": sum(len(store) for store in stores),
+            "volume_bytes": sum(store.volume() for store in stores)
+        },
+        "compression": compression,
+        "pending_refreshes": pending_refreshes
     }
 
 
+def reset_cache_stats() -> None:
+    """
+    Reset the counters reported by `get_cache_stats`, e.g. at the start of
+    a refresh run. Cached data is left untouched.
+    """
+    for stats in list(_function_stats.values()):
+        stats.reset()
+    memory_cache.reset_stats()
+    with _compression_lock:
+        _compression_stats.clear()
+
+
 def clear_cache() -> None:
     """
     Clear all cached data.
@@ -88,7 +1011,17 @@ def clear_cache() -> None:
     This removes all cached API responses. Use this when you need to
     refresh data from external sources or free up disk space.
     """
-    cache.clear()
+    for store in _all_caches():
+        store.clear(retry=True)
+    memory_cache.clear()
+
+
+def clear_negative_cache() -> None:
+    """
+    Clear cached "not found" answers only.
+    """
+    negative_cache.clear(retry=True)
+    memory_cache.clear()
 
 
 def clear_cache_for_function(func) -> None:
@@ -97,13 +1030,277 @@ def clear_cache_for_function(func) -> None:
 
     Args:
         func: The cached function whose cache should be cleared.
-              This should be the original function decorated with @cache.memoize().
+              This should be the original function decorated with @memoize().
 
     Example:
-        from bdqc_taxa.gbif import _get_cached
-        clear_cache_for_function(_get_cached)
+        from bdqc_taxa.gbif import _fetch_url_data
+        clear_cache_for_function(_fetch_url_data)
+    """
+    if not hasattr(func, 'cache_base'):
+        raise ValueError("The provided function is not cached with @memoize().")
+    base = func.cache_base
+    memory_cache.evict(base)
+    for store in (get_namespace_cache(getattr(func, 'namespace', None)), negative_cache):
+        for key in list(store):
+            if isinstance(key, tuple) and key[:len(base)] == base:
+                store.delete(key, retry=True)
+
+
+SNAPSHOT_FORMAT = "bdqc_taxa-cache-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def _source_functions():
+    # Importing the source modules registers their memoized functions
+    from . import gbif, global_names, wikidata  # noqa: F401
+
+
+def export_snapshot(path, namespaces: Optional[Iterable[str]] = None,
+                    since: Optional[float] = None) -> int:
+    """
+    Write cached answers to a gzip-compressed snapshot file, to be loaded
+    on another host with `import_snapshot`.
+
+    Negative ("not found") answers are short-lived and not exported.
+
+    Args:
+        path: File to write.
+        namespaces: Source namespaces to export (e.g. ["gbif"]), all if None.
+        since: Only export answers fetched at or after this `time.time()`
+            timestamp.
+
+    Returns:
+        int: Number of exported entries.
+    """
+    _source_functions()
+    if namespaces is not None:
+        namespaces = set(namespaces)
+    stores = [cache] + [get_namespace_cache(namespace)
+                        for namespace in set(_function_namespaces.values())]
+    count = 0
+    with gzip.open(path, "wb") as f:
+        pickle.dump({"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION,
+                     "created": time.time()}, f, protocol=4)
+        for store in {id(store): store for store in stores}.values():
+            for key in store:
+                if not isinstance(key, tuple) or not key:
+                    continue
+                namespace = _function_namespaces.get(key[0])
+                if namespaces is not None and namespace not in namespaces:
+                    continue
+                value, stored_at = store.get(key, default=ENOVAL, tag=True, retry=True)
+                if value is ENOVAL or isinstance(value, BaseException):
+                    continue
+                if since is not None and (_age(stored_at) is None or stored_at < since):
+                    continue
+                pickle.dump((namespace, key, value, stored_at), f, protocol=4)
+                count += 1
+    return count
+
+
+def import_snapshot(path, merge: bool = True,
+                    namespaces: Optional[Iterable[str]] = None) -> int:
+    """
+    Load a snapshot written by `export_snapshot` into the cache.
+
+    Args:
+        path: Snapshot file.
+        merge: If True, an entry already cached and fetched more recently
+            than the snapshot's is kept. If False, snapshot entries replace
+            the cached ones.
+        namespaces: Source namespaces to import, all if None.
+
+    Returns:
+        int: Number of imported entries.
     """
-    if hasattr(func, 'cache'):
-        func.cache.clear()
-    else:
-        raise ValueError("The provided function is not cached with @cache.memoize().")
\ No newline at end of file
+    _source_functions()
+    if namespaces is not None:
+        namespaces = set(namespaces)
+    count = 0
+    with gzip.open(path, "rb") as f:
+        header = pickle.load(f)
+        if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a bdqc_taxa cache snapshot")
+        if header.get("version", 0) > SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {header['version']}")
+        while True:
+            try:
+                namespace, key, value, stored_at = pickle.load(f)
+            except EOFError:
+                break
+            if namespaces is not None and namespace not in namespaces:
+                continue
+            store = get_namespace_cache(namespace)
+            if merge:
+                _, current = store.get(key, default=ENOVAL, tag=True, retry=True)
+                current_age = _age(current)
+                snapshot_age = _age(stored_at)
+                if current_age is not None and (
+                        snapshot_age is None or current_age <= snapshot_age):
+                    continue
+            store.set(key, value, tag=stored_at, retry=True)
+            count += 1
+    memory_cache.clear()
+    return count
+
+
+WARM_SOURCES = ("gbif", "global_names", "wikidata")
+
+
+def _warm_tasks(names: List[str], authorships: List[Optional[str]], sources) -> list:
+    """`(label, source, func)` lookups filling the cache entries of `names`."""
+    # Imported here, the source modules import this one
+    from . import global_names
+    from .taxa_ref import TaxaRef
+    from .vernacular import Vernacular
+
+    tasks = []
+    if "global_names" in sources:
+        for i in range(0, len(names), global_names.BATCH_SIZE):
+            batch = slice(i, i + global_names.BATCH_SIZE)
+            label = f"{len(names[batch])} names from {names[batch][0]}"
+            tasks.append((label, "global_names", functools.partial(
+                global_names.verify_many, names[batch], authorships[batch])))
+    for name, authorship in zip(names, authorships):
+        if "gbif" in sources:
+            tasks.append((name, "gbif", functools.partial(
+                TaxaRef.from_gbif, name, authorship)))
+            tasks.append((name, "gbif", functools.partial(
+                Vernacular.from_gbif_match, name, authorship)))
+        if "wikidata" in sources:
+            tasks.append((name, "wikidata", functools.partial(
+                Vernacular.from_wikidata_match, name)))
+    return tasks
+
+
+def warm(names: Iterable[str], authorships: Optional[Iterable[Optional[str]]] = None,
+         sources: Iterable[str] = WARM_SOURCES, concurrency: int = 8,
+         progress: Optional[Callable] = None) -> dict:
+    """
+    Pre-populate the cache with the source answers of a list of names, as
+    looked up by `TaxaRef.from_all_sources` and `Vernacular.from_match`.
+
+    Global Names is queried in batches (`global_names.verify_many`), GBIF
+    (match, species and vernacular names) and Wikidata name by name.
+    Lookups run `concurrency` at a time, within the per-host rate limits of
+    `bdqc_taxa.transport`.
+
+    Args:
+        names: Scientific names.
+        authorships: Authorships, one per name (or None).
+        sources: Sources to query, among `WARM_SOURCES`.
+        concurrency: Number of lookups run at once.
+        progress: Called as `progress(done, total)` after each lookup.
+
+    Returns:
+        dict: Dictionary containing:
+            - names: Number of distinct names
+            - lookups: Number of lookups run
+            - failed: List of `{"name", "source", "error"}` dicts
+    """
+    names = list(names)
+    authorships = [None] * len(names) if authorships is None else list(authorships)
+    if len(authorships) != len(names):
+        raise ValueError("names and authorships must have the same length")
+    sources = set(sources)
+    unknown = sources - set(WARM_SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown sources: {sorted(unknown)}")
+
+    records = list(dict.fromkeys(
+        (normalize_name(name), authorship or None)
+        for name, authorship in zip(names, authorships) if name and name.strip()))
+    tasks = _warm_tasks([r[0] for r in records], [r[1] for r in records], sources)
+
+    failed = []
+    done = 0
+    with futures.ThreadPoolExecutor(max(1, concurrency)) as executor:
+        pending = {executor.submit(func): (label, source)
+                   for label, source, func in tasks}
+        for future in futures.as_completed(pending):
+            label, source = pending[future]
+            error = future.exception()
+            if error is not None:
+                failed.append({"name": label, "source": source, "error": repr(error)})
+            done += 1
+            if progress is not None:
+                progress(done, len(tasks))
+    wait_for_refreshes()
+    return {"names": len(records), "lookups": len(tasks), "failed": failed}
+
+
+def _read_names(path: str):
+    """Names and authorships of a file, one per line, tab separated."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        names, authorships = [], []
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if not fields[0].strip():
+                continue
+            names.append(fields[0])
+            authorships.append(fields[1] if len(fields) > 1 and fields[1].strip() else None)
+        return names, authorships
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, see the module docstring."""
+    parser = argparse.ArgumentParser(
+        prog="bdqc-taxa-cache", description="Manage the bdqc_taxa cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    warm_parser = commands.add_parser(
+        "warm", help="Pre-populate the cache from a list of names.")
+    warm_parser.add_argument(
+        "names", help="File of scientific names, one per line with an optional "
+                      "tab separated authorship ('-' for stdin).")
+    warm_parser.add_argument("--sources", nargs="+", choices=WARM_SOURCES,
+                             default=list(WARM_SOURCES))
+    warm_parser.add_argument("--concurrency", type=int, default=8)
+
+    commands.add_parser("info", help="Print cache size and statistics.")
+
+    export_parser = commands.add_parser("export", help="Write a cache snapshot.")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--namespaces", nargs="+")
+    export_parser.add_argument("--since", type=float,
+                               help="Only answers fetched after this Unix timestamp.")
+
+    import_parser = commands.add_parser("import", help="Load a cache snapshot.")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--namespaces", nargs="+")
+    import_parser.add_argument("--replace", action="store_true",
+                               help="Overwrite entries fetched more recently.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        names, authorships = _read_names(args.names)
+
+        def progress(done, total):
+            if done == total or done % 100 == 0:
+                print(f"{done}/{total} lookups", file=sys.stderr)
+
+        report = warm(names, authorships, sources=args.sources,
+                      concurrency=args.concurrency, progress=progress)
+        for failure in report["failed"]:
+            print(f"Failed {failure['source']} lookup of {failure['name']}: "
+                  f"{failure['error']}", file=sys.stderr)
+        print(f"Warmed {report['names']} names with {report['lookups']} lookups, "
+              f"{len(report['failed'])} failed")
+        return 1 if report["failed"] else 0
+    if args.command == "info":
+        print(json.dumps({"info": get_cache_info(), "stats": get_cache_stats()},
+                         indent=2, default=str))
+    elif args.command == "export":
+        count = export_snapshot(args.path, namespaces=args.namespaces, since=args.since)
+        print(f"Exported {count} entries to {args.path}")
+    elif args.command == "import":
+        count = import_snapshot(args.path, merge=not args.replace,
+                                namespaces=args.namespaces)
+        print(f"Imported {count} entries from {args.path}")
+    return 0
+
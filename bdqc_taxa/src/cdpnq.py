@@ -12,11 +12,12 @@
 
 
 
-import sqlite3
 import importlib.resources
 import os.path
 from typing import Union
 
+from .custom_sources import connection
+
 
 # Get the database file from the package data
 DB_FILE = 'custom_sources.sqlite'
@@ -36,8 +37,8 @@ if not os.path.exists(db_path):
     except (ImportError, FileNotFoundError):
         raise FileNotFoundError(f"Could not locate {DB_FILE} in package data")
 
-# Connect to the database
-conn = sqlite3.connect(db_path)
+# Connect to the database, see `custom_sources.connection`
+conn = connection(db_path)
 
 def match_taxa_odonates(name) -> Union[dict, None]:
     """Match a species name to the Bryoquel database
@@ -61,7 +62,7 @@ def match_taxa_odonates(name) -> Union[dict, None]:
     """
 
     # Get the cursor
-    c = conn.cursor()
+    c = connection(db_path).cursor()
 
     # Get the species name
     name = name.strip()
@@ -114,7 +115,7 @@ def match_taxa_vertebrates(name) -> Union[dict, None]:
     """
 
     # Get the cursor
-    c = conn.cursor()
+    c = connection(db_path).cursor()
 
     # Get the species name
     name = name.strip()
@@ -0,0 +1,19 @@
+# Connections to the custom sources sqlite database (Bryoquel, CDPNQ, ELISO)
+
+import sqlite3
+import threading
+
+# One connection per thread and database file, as sqlite connections can't be
+# used from another thread (e.g. cache refresh workers)
+_local = threading.local()
+
+
+def connection(db_path: str) -> sqlite3.Connection:
+    """Return the calling thread's connection to the database at `db_path`."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = sqlite3.connect(db_path)
+    return conn
@@ -0,0 +1,113 @@
+"""
+Time budgets for remote source lookups.
+
+A deadline set with `deadline()` applies to every request sent through
+`bdqc_taxa.transport` in the same context: socket timeouts are capped to the
+remaining time and `DeadlineExceeded` is raised once it is spent.
+
+Usage:
+    from bdqc_taxa import deadline
+
+    with deadline.deadline(5):
+        refs = TaxaRef.from_all_sources("Acer saccharum")
+
+    # Lookups that ran out of time are flagged on the returned list
+    if refs.partial:
+        print(refs.missing_sources)
+
+Deadlines are stored in a context variable. Code running the lookups in
+other threads must copy the context (`contextvars.copy_context().run`).
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+# Absolute deadline, on the `time.monotonic()` clock
+_deadline = contextvars.ContextVar("bdqc_taxa_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request can't complete within the current time budget."""
+
+
+class SourceResults(list):
+    """
+    List of results that records the sources skipped for lack of time.
+
+    Attributes:
+        missing_sources: Names of the sources that did not answer before the
+            deadline.
+        partial: True if any source is missing.
+    """
+    def __init__(self, iterable=(), missing_sources: Optional[List[str]] = None):
+        super().__init__(iterable)
+        self.missing_sources = list(missing_sources or [])
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.missing_sources)
+
+
+@contextmanager
+def deadline(time_budget: Optional[float] = None, at: Optional[float] = None):
+    """
+    Limit the time spent on requests within the block.
+
+    Args:
+        time_budget: Seconds from now.
+        at: Absolute deadline as a `time.time()` timestamp.
+
+    A deadline already in effect is only ever shortened.
+    """
+    limits = []
+    if time_budget is not None:
+        limits.append(time.monotonic() + time_budget)
+    if at is not None:
+        limits.append(time.monotonic() + (at - time.time()))
+    current = _deadline.get()
+    if current is not None:
+        limits.append(current)
+    token = _deadline.set(min(limits) if limits else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, None if there is none."""
+    current = _deadline.get()
+    if current is None:
+        return None
+    return current - time.monotonic()
+
+
+def check() -> None:
+    """Raise `DeadlineExceeded` if the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Time budget exhausted")
+
+
+def cap_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Return `timeout` capped to the time left, raising if there is none."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Time budget exhausted")
+    return left if timeout is None else min(timeout, left)
+
+
+def call_source(results: SourceResults, source: str, func, *args, **kwargs) -> list:
+    """
+    Call a source lookup, returning [] and recording `source` in
+    `results.missing_sources` if it runs out of time.
+    """
+    try:
+        return func(*args, **kwargs)
+    except DeadlineExceeded:
+        results.missing_sources.append(source)
+        return []
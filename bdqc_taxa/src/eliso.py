@@ -17,10 +17,11 @@
 #====================================================================================================
 
 
-import sqlite3
 import importlib.resources
 import os.path
 
+from .custom_sources import connection
+
 
 # Get the database file from the package data
 DB_FILE = 'custom_sources.sqlite'
@@ -40,8 +41,8 @@ if not os.path.exists(db_path):
     except (ImportError, FileNotFoundError):
         raise FileNotFoundError(f"Could not locate {DB_FILE} in package data")
 
-# Connect to the database
-conn = sqlite3.connect(db_path)
+# Connect to the database, see `custom_sources.connection`
+conn = connection(db_path)
 
 def match_taxa(name) -> dict:
     """Match a species name to Eliso's invertebrate database
@@ -66,7 +67,7 @@ def match_taxa(name) -> dict:
     """
 
     # Get the cursor
-    c = conn.cursor()
+    c = connection(db_path).cursor()
 
     # Get the species name
     name = name.strip()
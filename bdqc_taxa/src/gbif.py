@@ -1,20 +1,50 @@
-from urllib.request import Request, urlopen, URLError, HTTPError
+from urllib.request import Request, URLError, HTTPError
 from urllib.parse import urlencode
-import json
 from inspect import signature
-from .cache import cache
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from .cache import memoize, normalize_name
+from .transport import urlopen, run_async, loads
 
 
 HOST = "https://api.gbif.org"
+HOST_NAME = "api.gbif.org"
 LIMIT = 100
 RESP_RESULT_KEY = 'results'
 GBIF_TAXONOMIC_BACKBONE_DATASET_KEY = 'd7dddbf4-2cf0-4f39-9b2a-bb099caae36c'
-
-
-@cache.memoize()
-def _get_url_data(url, params: dict = None, limit: int = None, offset: int = 0):
-    if not params:
-        params = {}
+# Query parameters holding a name, normalized in cache keys
+NAME_PARAMS = ('scientificName', 'name', 'q')
+
+
+def _is_not_found(resp) -> bool:
+    """True for answers that carry no record, kept in the negative cache."""
+    if not isinstance(resp, dict):
+        return False
+    if resp.get('diagnostics', {}).get('matchType') == 'NONE':
+        return True
+    return 'results' in resp and not resp['results'] and not resp.get('offset')
+
+
+def _canonical_request(url, params: dict = None, limit: int = None, offset: int = 0):
+    """
+    Arguments of `_fetch_url_data` in canonical form: names normalized and
+    params as a sorted tuple of items, so equivalent requests share a cache
+    entry.
+    """
+    params = dict(params or {})
+    for key in NAME_PARAMS:
+        if key in params:
+            params[key] = normalize_name(params[key])
+    return (url, tuple(sorted(params.items()))), {"limit": limit, "offset": offset}
+
+
+@memoize(negative=_is_not_found, namespace="gbif", normalize=_canonical_request)
+def _fetch_url_data(url, params: dict = None, limit: int = None, offset: int = 0):
+    """
+    Cached GET of a GBIF API url. Raises `HTTPError`/`URLError` on failure
+    so that errors are never stored in the cache.
+    """
+    params = dict(params or {})
     if limit:
         params.update({
             "limit": limit,
@@ -23,8 +53,16 @@ def _get_url_data(url, params: dict = None, limit: int = None, offset: int = 0):
     req = Request(
         url=f"{url}?{urlencode(params)}",
         headers={"Content-Type": "application/json"})
+    data = urlopen(req)
+    try:
+        out = loads(data.read())
+        return out
+    except KeyError:
+        return [None]
+
+def _get_url_data(url, params: dict = None, limit: int = None, offset: int = 0):
     try:
-        data = urlopen(req)
+        return _fetch_url_data(url, params, limit=limit, offset=offset)
     except HTTPError as e:
         return e
     except URLError as e:
@@ -34,34 +72,60 @@ def _get_url_data(url, params: dict = None, limit: int = None, offset: int = 0):
             return e.code
         else:
             return e
-    else:
-        try:
-            out = json.loads(data.read().decode('utf-8'))
-            return out
-        except KeyError:
-            return [None]
 
-def _pagin_get_url_data(url, params: dict = None, limit: int = LIMIT,
+def _iter_url_data(url, params: dict = None, limit: int = LIMIT,
     resp_result_key = RESP_RESULT_KEY):
+    """
+    Yield the records of a paginated GBIF endpoint as pages arrive.
 
-    end_of_records = False
+    While the caller consumes a page, the next one is fetched in a
+    background thread. Errors are raised as `HTTPError`/`URLError`.
+    """
+    executor = None
     offset = 0
-    results = []
-    while not end_of_records:
-        resp = _get_url_data(url, params, limit = LIMIT, offset = offset)
-        end_of_records = resp["endOfRecords"]
-        offset += limit
-        results.extend(resp[resp_result_key])
-    return results
+    try:
+        resp = _fetch_url_data(url, dict(params or {}), limit=limit, offset=offset)
+        while True:
+            end_of_records = resp.get("endOfRecords", True)
+            if not end_of_records:
+                # Prefetch next page
+                offset += limit
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=1)
+                next_resp = executor.submit(
+                    contextvars.copy_context().run,
+                    _fetch_url_data, url, dict(params or {}), limit=limit, offset=offset)
+            yield from resp[resp_result_key]
+            if end_of_records:
+                break
+            resp = next_resp.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+def _pagin_get_url_data(url, params: dict = None, limit: int = LIMIT,
+    resp_result_key = RESP_RESULT_KEY):
+    return list(_iter_url_data(url, params, limit, resp_result_key))
 
 
 class Species:
     @classmethod
-    def get_vernacular_name(cls, species_id: int):
+    def iter_vernacular_names(cls, species_id: int, limit: int = LIMIT):
+        """
+        Yield the vernacular names of a species, fetching pages as needed.
+        """
         url = f"{HOST}/v1/species/{species_id}/vernacularNames"
-        results = _pagin_get_url_data(url)
+        yield from _iter_url_data(url, limit=limit)
+
+    @classmethod
+    def get_vernacular_name(cls, species_id: int):
+        results = list(cls.iter_vernacular_names(species_id))
         return results
 
+    @classmethod
+    async def get_vernacular_name_async(cls, species_id: int):
+        return await run_async(HOST_NAME, cls.get_vernacular_name, species_id)
+
     @classmethod
     def match_v1(cls, name: str = "", rank: str = "", strict: str = "", 
         verbose: str = "", kingdom: str = "", phylum: str = "",
@@ -133,6 +197,13 @@ class Species:
             out = alternatives[0] if alternatives else out
 
         return out
+
+    @classmethod
+    async def match_async(cls, scientific_name: str = "", taxon_rank: str = "", **kwargs):
+        """
+        Async version of `match`, sharing its cache entries.
+        """
+        return await run_async(HOST_NAME, cls.match, scientific_name, taxon_rank, **kwargs)
     
     @classmethod
     def search(cls, query: str = "", dataset_key: str = GBIF_TAXONOMIC_BACKBONE_DATASET_KEY,
@@ -149,8 +220,30 @@ class Species:
         results = _get_url_data(url, params)
         return results
 
+    @classmethod
+    def iter_search(cls, query: str = "", dataset_key: str = GBIF_TAXONOMIC_BACKBONE_DATASET_KEY,
+                    limit: int = LIMIT, **kwargs):
+        """
+        Yield all records of a species search, page by page, instead of the
+        first page only as `search` does.
+        """
+        params = {
+            "q": query,
+            "datasetKey": dataset_key
+        }
+
+        params.update(kwargs)
+        params.pop("offset", None)
+
+        url = f"{HOST}/v1/species/search"
+        yield from _iter_url_data(url, params, limit=limit)
+
     @classmethod
     def get(cls, key: int):
         url = f"{HOST}/v1/species/{key}"
         results = _get_url_data(url)
-        return results
\ No newline at end of file
+        return results
+
+    @classmethod
+    async def get_async(cls, key: int):
+        return await run_async(HOST_NAME, cls.get, key)
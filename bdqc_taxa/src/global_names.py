@@ -1,21 +1,39 @@
-from urllib.request import Request, urlopen, URLError, HTTPError
+from urllib.request import Request
 from urllib.parse import urlencode, quote_plus
 from typing import List
+import contextvars
 import json
-from .cache import cache
+import copy
+from .cache import memoize, normalize_name
+from .transport import urlopen, run_async, loads
 
 
-__all__ = ['verify']
+__all__ = ['verify', 'verify_many', 'verify_async', 'verify_members']
 
 VERIFY_PREFIX = "api/v1/verifications"
 HOST = "https://verifier.globalnames.org"
+HOST_NAME = "verifier.globalnames.org"
 
 DATA_SOURCES = [1, 3, 147]
 
 ALL_MATCHES = True
 
+# Number of name strings sent per POST request by `verify_many`
+BATCH_SIZE = 1000
 
-@cache.memoize()
+
+def _is_no_match(gn_out) -> bool:
+    """True when no name was matched, kept in the negative cache."""
+    names = gn_out.get('names') if isinstance(gn_out, dict) else None
+    return bool(names) and all(name.get('matchType') == 'NoMatch' for name in names)
+
+
+def _canonical_verify(name: str, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES):
+    """Arguments of `_verify` in canonical form, see `memoize`."""
+    return (normalize_name(name), tuple(int(v) for v in data_sources), bool(all_matches)), {}
+
+
+@memoize(negative=_is_no_match, namespace="global_names", normalize=_canonical_verify)
 def _verify(name: str, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES) -> dict:
     # Format python bool to json bool
     if all_matches:
@@ -36,23 +54,14 @@ def _verify(name: str, data_sources: list = DATA_SOURCES, all_matches: bool = AL
         url="/".join([HOST, VERIFY_PREFIX, path_name]) + "?" + params,
         headers={"Content-Type": "application/json"}
     )
+    # HTTPError and URLError are raised, not returned, to keep them out of
+    # the cache
+    data = urlopen(req)
     try:
-        data = urlopen(req)
-    except HTTPError as e:
-        return e
-    except URLError as e:
-        if hasattr(e, 'reason'):
-            return e.reason
-        elif hasattr(e, 'code'):
-            return e.code
-        else:
-            return e
-    else:
-        try:
-            out = json.loads(data.read().decode('utf-8'))
-            return out
-        except KeyError:
-            return [None]
+        out = loads(data.read())
+        return out
+    except KeyError:
+        return [None]
 
 def _solve_source_name_conflicts(results: List[dict]) -> List[dict]:
     """
@@ -100,19 +109,22 @@ def _solve_authorship_conflicts(results: List[dict]) -> List[dict]:
 
     return out
 
-def verify(name: str, authorship: str = None, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES) -> List[dict]:
-    """
-    This function takes a list of names and returns a list of results from the global names verifier.
-    :param names: A name to verify.
-    :param authorship: Authorship of the name to verify.
-    :param data_sources: A list of data sources to use.
-    :param all_matches: Whether to return all matches.
-    :return: A list of results from the global names verifier.
-    """
-    if isinstance(authorship, str) and authorship.strip():
-            name = " ".join([name, authorship])
-            
-    gn_out = _verify(name, data_sources, all_matches)
+def _post_verify(names: List[str], data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES) -> dict:
+    body = {
+        'nameStrings': names,
+        'dataSources': [int(v) for v in data_sources],
+        'withAllMatches': bool(all_matches),
+        'withCapitalization': True
+    }
+    req = Request(
+        url="/".join([HOST, VERIFY_PREFIX]),
+        data=json.dumps(body).encode('utf-8'),
+        headers={"Content-Type": "application/json"}
+    )
+    data = urlopen(req)
+    return loads(data.read())
+
+def _process_results(gn_out: dict, authorship: str = None) -> dict:
     names = gn_out['names']
     for i, name in enumerate(names):
         try:
@@ -128,4 +140,138 @@ def verify(name: str, authorship: str = None, data_sources: list = DATA_SOURCES,
 
     gn_out['names'] = names
 
-    return gn_out
\ No newline at end of file
+    return gn_out
+
+def _full_name(name: str, authorship: str = None) -> str:
+    if isinstance(authorship, str) and authorship.strip():
+        name = " ".join([name, authorship])
+    return name
+
+def verify(name: str, authorship: str = None, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES) -> List[dict]:
+    """
+    This function takes a list of names and returns a list of results from the global names verifier.
+    :param names: A name to verify.
+    :param authorship: Authorship of the name to verify.
+    :param data_sources: A list of data sources to use.
+    :param all_matches: Whether to return all matches.
+    :return: A list of results from the global names verifier.
+    """
+    name = _full_name(name, authorship)
+            
+    gn_out = _verify(name, data_sources, all_matches)
+    return _process_results(gn_out, authorship)
+
+def verify_members(name: str, authorship: str = None, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES,
+                   executor=None) -> List[dict]:
+    """
+    Version of `verify` for pipe separated (complex) names, verifying each
+    member on its own. The answer is the same as `verify`, but members are
+    cached under their own name, shared with the single names and the other
+    complex names they appear in.
+    :param name: A name, members separated by "|".
+    :param authorship: Authorship of the name to verify.
+    :param data_sources: A list of data sources to use.
+    :param all_matches: Whether to return all matches.
+    :param executor: Optional `concurrent.futures.Executor` to verify the
+        members concurrently.
+    :return: A list of results from the global names verifier, in the same
+        format as `verify`.
+    """
+    name_strings = [v.strip() for v in _full_name(name, authorship).split("|")]
+    if executor is None:
+        gn_outs = [_verify(name_string, data_sources, all_matches) for name_string in name_strings]
+    else:
+        futures = [
+            executor.submit(contextvars.copy_context().run, _verify, name_string, data_sources, all_matches)
+            for name_string in name_strings]
+        gn_outs = [future.result() for future in futures]
+
+    gn_out = {
+        'metadata': gn_outs[0].get('metadata'),
+        'names': [name for member_out in gn_outs for name in member_out['names']]
+    }
+    return _process_results(gn_out, authorship)
+
+async def verify_async(name: str, authorship: str = None, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES) -> List[dict]:
+    """
+    Async version of `verify`, sharing its cache entries.
+    """
+    return await run_async(HOST_NAME, verify, name, authorship, data_sources, all_matches)
+
+def verify_many(names: List[str], authorships: List[str] = None, data_sources: list = DATA_SOURCES, all_matches: bool = ALL_MATCHES) -> List[dict]:
+    """
+    Batch version of `verify`.
+
+    Names not already cached are deduplicated and sent to the verifier in POST
+    requests of `BATCH_SIZE` name strings. Each answer is stored in the cache
+    entry `verify` would use for that name, so later single lookups are hits.
+    Answers are stored as their batch returns: if a request fails, its error
+    is raised and the answers of the previous batches stay cached.
+    :param names: A list of names to verify.
+    :param authorships: A list of authorships, one per name (or None).
+    :param data_sources: A list of data sources to use.
+    :param all_matches: Whether to return all matches.
+    :return: A list of results from the global names verifier, one per name,
+        in the same format as `verify`.
+    """
+    if authorships is None:
+        authorships = [None] * len(names)
+    if len(authorships) != len(names):
+        raise ValueError("names and authorships must have the same length")
+
+    full_names = [normalize_name(_full_name(name, authorship))
+                  for name, authorship in zip(names, authorships)]
+
+    # Lookup cached answers, collect the name strings still to verify.
+    # Pipe separated (complex) names are split as the GET endpoint does.
+    gn_outs = {}
+    pending = {}
+    for full_name in full_names:
+        if full_name in gn_outs or full_name in pending:
+            continue
+        cached = _verify.get_cached(
+            _verify.__cache_key__(full_name, data_sources, all_matches))
+        if cached is not None:
+            gn_outs[full_name] = cached
+        else:
+            pending[full_name] = [v.strip() for v in full_name.split("|")]
+
+    name_strings = list(dict.fromkeys(
+        name_string for name_strings in pending.values() for name_string in name_strings))
+    # Names are cached as soon as the batch holding their last member string
+    # returns, so that a failed batch doesn't lose the previous answers
+    position = {name_string: i for i, name_string in enumerate(name_strings)}
+    ready = {}
+    for full_name, members in pending.items():
+        batch_number = max(position[name_string] for name_string in members) // BATCH_SIZE
+        ready.setdefault(batch_number, []).append(full_name)
+
+    name_results = {}
+    for batch_number, i in enumerate(range(0, len(name_strings), BATCH_SIZE)):
+        batch = name_strings[i:i + BATCH_SIZE]
+        resp = _post_verify(batch, data_sources, all_matches)
+        metadata = resp.get('metadata', {})
+        name_results.update(zip(batch, resp['names']))
+
+        for full_name in ready.get(batch_number, []):
+            members = pending[full_name]
+            gn_out = {
+                'metadata': metadata,
+                'names': [name_results[name_string] for name_string in members]
+            }
+            _verify.set_cached(
+                _verify.__cache_key__(full_name, data_sources, all_matches), gn_out)
+            gn_outs[full_name] = gn_out
+            # Members of complex names are also cached on their own, for
+            # `verify_members`
+            if len(members) > 1:
+                for name_string in members:
+                    _verify.set_cached(
+                        _verify.__cache_key__(name_string, data_sources, all_matches),
+                        {'metadata': metadata, 'names': [name_results[name_string]]})
+
+    out = []
+    for full_name, authorship in zip(full_names, authorships):
+        gn_out = copy.deepcopy(gn_outs[full_name])
+        out.append(_process_results(gn_out, authorship))
+    return out
@@ -1,12 +1,14 @@
 import json
-from urllib.request import Request, urlopen, URLError, HTTPError
+from urllib.request import Request, URLError, HTTPError
 from urllib.parse import urlencode
+from .transport import urlopen, run_async, loads
 
 from datetime import datetime
 import multiprocessing
 from functools import partial
 
 HOST = "https://explorer.natureserve.org/api"
+HOST_NAME = "explorer.natureserve.org"
 
 CURRENT_DATE = datetime.now()
 
@@ -83,7 +85,7 @@ def _get_url_data(url, method="GET", params=None, body=None):
         return {"error": str(e)}
     else:
         try:
-            return json.loads(resp.read().decode("utf-8"))
+            return loads(resp.read())
         except Exception:
             return {}
 
@@ -219,6 +221,12 @@ def search_species(species_search_token=None,
         return None
     return result
 
+async def search_species_async(*args, **kwargs):
+    """
+    Async version of `search_species`, taking the same arguments.
+    """
+    return await run_async(HOST_NAME, search_species, *args, **kwargs)
+
 def _search_page(args):
     """Helper function for multiprocessing that searches a specific page"""
     page, search_func = args
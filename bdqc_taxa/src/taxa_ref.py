@@ -4,8 +4,17 @@ from . import global_names
 from . import gbif
 from . import bryoquel
 from . import cdpnq
+from . import cache
+from .deadline import SourceResults, call_source, deadline as limit_time
 from typing import List, Optional
 from inspect import signature
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import copy
+import logging
+import sys
+import threading
+import time
 
 GBIF_SOURCE_KEY = 11 # Corresponds to global names
 BRYOQUEL_SOURCE_KEY = 1001 # Not in global names so start at 1000
@@ -19,6 +28,15 @@ GBIF_RANKS = ['kingdom', 'phylum', 'class', 'order', 'family',
 
 DATA_SOURCES = [1, 3, 147] # COL, ITIS, VASCAN
 
+# Default for `from_all_sources(concurrent=None)`: query remote sources in parallel
+CONCURRENT_SOURCES = False
+# Worker threads shared by concurrent source lookups
+MAX_WORKERS = 8
+# Resolve the members of complex names ("A | B") in parallel
+CONCURRENT_MEMBERS = True
+# Worker threads shared by the member lookups of complex names
+MAX_MEMBER_WORKERS = 8
+
 SOURCES_PARENT_CLASSIFICATION_SRIDS = [
     # Only vascular plants
     {
@@ -46,7 +64,87 @@ SOURCES_PARENT_CLASSIFICATION_SRIDS = [
     }
 ]
 
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix="bdqc_taxa_ref")
+        return _executor
+
+# Member lookups get their own pool: they are submitted from tasks running on
+# `_executor` (concurrent sources, batch prefetch), which would deadlock if
+# all its workers waited on member tasks queued behind them. Member tasks
+# never wait on other tasks.
+_member_executor = None
+
+def _get_member_executor() -> ThreadPoolExecutor:
+    global _member_executor
+    with _executor_lock:
+        if _member_executor is None:
+            _member_executor = ThreadPoolExecutor(max_workers=MAX_MEMBER_WORKERS,
+                                                  thread_name_prefix="bdqc_taxa_member")
+        return _member_executor
+
+def _map_members(func, members: List[str], *args) -> list:
+    """
+    `[func(member, *args) for member in members]`, run on the member pool
+    when `CONCURRENT_MEMBERS` is set.
+    """
+    if not CONCURRENT_MEMBERS or len(members) < 2:
+        return [func(member, *args) for member in members]
+    executor = _get_member_executor()
+    futures = [executor.submit(contextvars.copy_context().run, func, member, *args)
+               for member in members]
+    return [future.result() for future in futures]
+
+# Column types of `TaxaRef.to_columns`, matching `rubus.taxa_ref`. Source
+# record ids are text: GBIF keys are converted to strings.
+COLUMN_TYPES = {
+    "id": "int64",
+    "source_id": "int64",
+    "source_record_id": "string",
+    "source_name": "string",
+    "scientific_name": "string",
+    "authorship": "string",
+    "rank": "string",
+    "rank_order": "int64",
+    "classification_srids": "list<string>",
+    "valid": "bool",
+    "valid_srid": "string",
+    "match_type": "string",
+    "is_parent": "bool",
+    "input_index": "int64",
+}
+COLUMN_FORMATS = ("dict", "numpy", "arrow")
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
 class TaxaRef:
+    # Slots keep the millions of refs built by batch runs compact. The
+    # attributes are still exposed as a dict by `__dict__` (and `vars()`).
+    __slots__ = (
+        "scientific_name", "id", "source_id", "source_record_id",
+        "source_name", "authorship", "rank", "rank_order",
+        "classification_srids", "valid", "valid_srid", "match_type",
+        "is_parent")
+
+    # Field order of `to_dict` and `to_tuple`
+    FIELDS = (
+        "id", "source_id", "source_record_id", "source_name",
+        "scientific_name", "authorship", "rank", "rank_order",
+        "classification_srids", "valid", "valid_srid", "match_type",
+        "is_parent")
+
+    # Values repeated across refs, interned to share one string
+    _INTERNED = ("source_name", "rank", "match_type")
+
     def __init__(self,
                  scientific_name: str = '',
                  id: int | None = None,
@@ -65,14 +163,14 @@ class TaxaRef:
         self.id = id
         self.source_id = source_id
         self.source_record_id = source_record_id
-        self.source_name = source_name
+        self.source_name = _intern(source_name)
         self.authorship = authorship
-        self.rank = rank.lower()
+        self.rank = _intern(rank.lower())
         self.rank_order = rank_order
         self.classification_srids = classification_srids
         self.valid = valid
         self.valid_srid = valid_srid
-        self.match_type = match_type
+        self.match_type = _intern(match_type)
         self.is_parent = is_parent
 
     def __repr__(self):
@@ -81,30 +179,121 @@ class TaxaRef:
     def __str__(self):
         return self.scientific_name
 
+    @classmethod
+    def to_columns(cls, refs, format: str = "dict"):
+        """
+        Columnar form of refs, for bulk writes and DataFrames.
+
+        `refs` is a list of refs, the result of one input, or a list of
+        such lists, as returned by the batch methods. The `input_index`
+        column holds the position of the input each ref comes from (0 for
+        a flat list).
+
+        Args:
+            refs: Refs or lists of refs.
+            format: "dict" for a dict of lists, "numpy" for a dict of NumPy
+                arrays or "arrow" for a `pyarrow.Table`. NumPy and pyarrow
+                are optional dependencies.
+
+        Columns are `FIELDS` then `input_index`, typed as in
+        `COLUMN_TYPES`. `classification_srids` is a list column and the
+        source record ids are strings.
+        """
+        if format not in COLUMN_FORMATS:
+            raise ValueError(
+                f"Unknown format {format!r}, expected one of {COLUMN_FORMATS}")
+        refs = list(refs)
+        if refs and not isinstance(refs[0], TaxaRef):
+            rows = [(ref, i) for i, group in enumerate(refs) for ref in group]
+        else:
+            rows = [(ref, 0) for ref in refs]
+
+        columns = {field: [] for field in COLUMN_TYPES}
+        values = [columns[field] for field in cls.FIELDS]
+        for ref, _ in rows:
+            for column, value in zip(values, ref.to_tuple()):
+                column.append(value)
+        columns["input_index"] = [i for _, i in rows]
+        for field in ("source_record_id", "valid_srid"):
+            columns[field] = [
+                value if value is None or type(value) is str else str(value)
+                for value in columns[field]]
+        columns["classification_srids"] = [
+            srids if srids is None else [str(srid) for srid in srids]
+            for srids in columns["classification_srids"]]
+
+        if format == "numpy":
+            return _numpy_columns(columns)
+        if format == "arrow":
+            return _arrow_columns(columns)
+        return columns
+
+    # Pickled as a dict of attributes, also read from refs pickled before
+    # `__slots__`
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, _intern(value) if key in self._INTERNED else value)
+
     @property
     def __dict__(self):
-        return {
-            "id": self.id,
-            "source_id": self.source_id,
-            "source_record_id": self.source_record_id,
-            "source_name": self.source_name,
-            "scientific_name": self.scientific_name,
-            "authorship": self.authorship,
-            "rank": self.rank,
-            "rank_order": self.rank_order,
-            "classification_srids": self.classification_srids,
-            "valid": self.valid,
-            "valid_srid": self.valid_srid,
-            "match_type": self.match_type,
-            "is_parent": self.is_parent
-        }
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        """Attributes as a dict, in `FIELDS` order."""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def to_tuple(self) -> tuple:
+        """Attribute values, in `FIELDS` order."""
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def key(self) -> tuple:
+        """
+        Hashable identity of the ref: `to_tuple` with the classification
+        as a tuple. Refs with equal attributes have the same key.
+        """
+        values = self.to_tuple()
+        srids = self.classification_srids
+        if isinstance(srids, list):
+            i = self.FIELDS.index("classification_srids")
+            values = values[:i] + (tuple(srids),) + values[i + 1:]
+        return values
 
     @classmethod
     def from_global_names(cls, name: str, authorship: Optional[str] = None, data_sources: Optional[List[int]] = None):
         if data_sources is None:
             data_sources = DATA_SOURCES
 
-        gn_results = global_names.verify(name, authorship, data_sources=data_sources)
+        if is_complex(name):
+            # Members verified one by one, sharing their cache entries
+            gn_results = global_names.verify_members(
+                name, authorship, data_sources=data_sources,
+                executor=_get_member_executor() if CONCURRENT_MEMBERS else None)
+        else:
+            gn_results = global_names.verify(name, authorship, data_sources=data_sources)
+        return cls._from_global_names_results(gn_results)
+
+    @classmethod
+    def from_global_names_many(cls, names: List[str], authorships: Optional[List[str]] = None, data_sources: Optional[List[int]] = None,
+                               columns: Optional[str] = None):
+        """
+        Batch version of `from_global_names`, verifying all names with
+        `global_names.verify_many`. Returns one list of refs per input name,
+        or their `to_columns` form in the `columns` format if given.
+        """
+        if data_sources is None:
+            data_sources = DATA_SOURCES
+
+        gn_results_list = global_names.verify_many(names, authorships, data_sources=data_sources)
+        out = [cls._from_global_names_results(gn_results) for gn_results in gn_results_list]
+        if columns is not None:
+            return cls.to_columns(out, columns)
+        return out
+
+    @classmethod
+    def _from_global_names_results(cls, gn_results: dict):
         gn_results = gn_results['names']
         try:
             gn_results = [
@@ -176,8 +365,8 @@ class TaxaRef:
     def from_gbif(cls, name: str, authorship: str = None):
         out = []
         names = [v.strip() for v in name.split("|")]
-        for name in names:
-            out.extend(cls._from_gbif_singleton(name, authorship))
+        for refs in _map_members(cls._from_gbif_singleton, names, authorship):
+            out.extend(refs)
         
         return out
 
@@ -298,42 +487,43 @@ class TaxaRef:
         return out
     
     @classmethod
-    def _prune_parent_taxa(cls, taxa_ref_list: List[TaxaRef], parent_taxa: str):
-        out = []
-        # List of ids of taxa_ref rows to keep corresponding to the parent taxa
-        parent_srids = []
+    def _prune_parent_taxa(cls, taxa_ref_list: List[TaxaRef], parent_taxa: str | List[str]):
+        """
+        Keep the refs in the branches of `parent_taxa`, a scientific name or
+        a list of names whose branches are all kept.
+        """
+        parents = {parent_taxa} if isinstance(parent_taxa, str) else set(parent_taxa)
+        # Set of ids of taxa_ref rows to keep corresponding to the parent taxa
+        parent_srids = set()
         keep_ids = set()
 
         # Find branches with parent_srids
         for ref in taxa_ref_list:
-            if ref.scientific_name == parent_taxa:
+            if ref.scientific_name in parents:
                 # Extend set of parent_srids
-                parent_srids.append(ref.source_record_id)
+                parent_srids.add(ref.source_record_id)
 
                 # Extend grand_parent_srids
                 keep_ids.update(ref.classification_srids[:-1])
 
+        # Sources without whole branch starting from kingdom, for which
+        # one of the parents is listed
+        partial_sources = {
+            source['source_name'] for source in SOURCES_PARENT_CLASSIFICATION_SRIDS
+            if not parents.isdisjoint(source['scientific_name'])}
 
-        # Find whole branches with parents srids
         for ref in taxa_ref_list:
-            # Keep all nodes in branches with parent_srids and add to keep_names
-            if any([srid in ref.classification_srids for srid in parent_srids if ref.classification_srids]):
+            # Keep all nodes in branches with parent_srids
+            if ref.classification_srids and not parent_srids.isdisjoint(ref.classification_srids):
                 keep_ids.update(ref.classification_srids)
 
-        # Special cases for sources without whole branch starting from kingdom
-        for ref in taxa_ref_list:
-            for source in SOURCES_PARENT_CLASSIFICATION_SRIDS:
-                # Check if parent is listed for sources without whole branch
-                if ref.source_name == source['source_name'] and \
-                        parent_taxa in source['scientific_name']:
-                    # Add ref to keep_ids
-                    keep_ids.update([ref.source_record_id])
+            # Special cases for sources without whole branch
+            if ref.source_name in partial_sources:
+                keep_ids.add(ref.source_record_id)
 
         # Keep only the rows with ids in keep_ids
-        out = [ref for ref in taxa_ref_list if ref.valid_srid in keep_ids]
-        
-        return out
-    
+        return [ref for ref in taxa_ref_list if ref.valid_srid in keep_ids]
+
     @classmethod
     def from_custom_sources_fuzzy_matched(cls, fuzzy_name: str, match_type: str = None):
         out_custom = []
@@ -353,15 +543,195 @@ class TaxaRef:
         return out_custom
 
     @classmethod
-    def from_all_sources(cls, name: str, authorship: str = None, parent_taxa: str = None):
-        # Capitalize first letter
-        name = name.strip()
-        name = name[0].upper() + name[1:]
-            
-        out = cls.from_global_names(name, authorship)
-        out.extend(cls.from_gbif(name, authorship))
-        out.extend(cls.from_bryoquel(name)) # exact match only
-        out.extend(cls.from_cdpnq(name)) # exact match only
+    def _from_sources(cls, name: str, authorship: str = None, concurrent: bool = False):
+        out = SourceResults()
+        if not concurrent:
+            out.extend(call_source(out, 'global_names', cls.from_global_names, name, authorship))
+            out.extend(call_source(out, 'gbif', cls.from_gbif, name, authorship))
+            out.extend(cls.from_bryoquel(name)) # exact match only
+            out.extend(cls.from_cdpnq(name)) # exact match only
+            return out
+
+        # Remote sources run in worker threads. Local sources are fast enough
+        # to stay in the calling thread.
+        executor = _get_executor()
+        gn_future = executor.submit(
+            contextvars.copy_context().run,
+            call_source, out, 'global_names', cls.from_global_names, name, authorship)
+        gbif_future = executor.submit(
+            contextvars.copy_context().run,
+            call_source, out, 'gbif', cls.from_gbif, name, authorship)
+        out_bryoquel = cls.from_bryoquel(name) # exact match only
+        out_cdpnq = cls.from_cdpnq(name) # exact match only
+
+        # Same order as the sequential mode
+        out.extend(gn_future.result())
+        out.extend(gbif_future.result())
+        out.extend(out_bryoquel)
+        out.extend(out_cdpnq)
+        out.missing_sources.sort(key=['global_names', 'gbif'].index)
+        return out
+
+    @classmethod
+    def from_all_sources(cls, name: str, authorship: str = None, parent_taxa: str | List[str] = None,
+                         concurrent: Optional[bool] = None,
+                         time_budget: Optional[float] = None,
+                         deadline: Optional[float] = None,
+                         use_cache: Optional[bool] = None):
+        """
+        Match a name against all sources and return the merged taxa_ref rows.
+
+        If `concurrent` is True, the remote sources (Global Names, GBIF) are
+        queried in parallel; defaults to `CONCURRENT_SOURCES`. The output is
+        the same in both modes. The members of complex names ("A | B") are
+        looked up in parallel if `CONCURRENT_MEMBERS` is set, each cached on
+        its own.
+
+        If `parent_taxa` is given (a scientific name or a list of names), only
+        the refs in the branches of these taxa are kept.
+
+        `time_budget` (seconds) and `deadline` (`time.time()` timestamp) limit
+        the time spent on remote requests. A source that runs out of time is
+        skipped and listed in `missing_sources` of the returned
+        `SourceResults`, whose `partial` attribute is then True.
+
+        If `use_cache` is True (default `cache.RESULT_CACHE`), the finished
+        rows are cached in the "results" namespace, keyed on the normalized
+        name, authorship, parent taxa, data sources, library version and
+        custom sources database. Partial results are not cached.
+        """
+        if use_cache is None:
+            use_cache = cache.RESULT_CACHE
+        if use_cache:
+            return _cached_from_all_sources(
+                name, authorship, parent_taxa, concurrent=concurrent,
+                time_budget=time_budget, deadline=deadline)
+        return cls._match_all_sources(name, authorship, parent_taxa, concurrent,
+                                      time_budget, deadline)
+
+    @classmethod
+    def from_all_sources_many(cls, records, concurrent: Optional[bool] = None,
+                              time_budget: Optional[float] = None,
+                              deadline: Optional[float] = None,
+                              use_cache: Optional[bool] = None,
+                              columns: Optional[str] = None) -> List[SourceResults]:
+        """
+        Batch version of `from_all_sources`.
+
+        `records` are `(name, authorship, parent_taxa)` tuples (authorship
+        and parent_taxa optional) or names. Identical inputs are resolved
+        once. The remote answers are fetched ahead into the cache: Global
+        Names in batches (`global_names.verify_many`) while GBIF lookups run
+        concurrently. With `use_cache`, rows already in the result cache are
+        returned as they are and the others are stored there, as
+        `global_names.verify_many` does. Each distinct input is then resolved
+        from the fetched answers, so the output is the same as per-name calls.
+
+        `time_budget` and `deadline` apply to the whole batch.
+
+        Returns one `SourceResults` per record, in input order, or their
+        `to_columns` form in the `columns` format ("dict", "numpy" or
+        "arrow") if given.
+        """
+        keys = []
+        for record in records:
+            if isinstance(record, str):
+                record = (record,)
+            name, authorship, parent_taxa = (tuple(record) + (None, None))[:3]
+            # Same normalization as `from_all_sources`
+            name = cache.normalize_name(name)
+            authorship = cache.normalize_name(authorship, capitalize=False) or None
+            if isinstance(parent_taxa, list):
+                parent_taxa = tuple(parent_taxa)
+            keys.append((name, authorship, parent_taxa))
+        unique = list(dict.fromkeys(keys))
+
+        if time_budget is not None:
+            at = time.time() + time_budget
+            deadline = at if deadline is None else min(deadline, at)
+
+        if use_cache is None:
+            use_cache = cache.RESULT_CACHE
+        results = {}
+        cache_keys = {}
+        if use_cache:
+            # Rows already in the result cache need no source answers
+            for key in unique:
+                cache_keys[key] = _cached_from_all_sources.__cache_key__(*key)
+                rows = _cached_from_all_sources.get_cached(cache_keys[key])
+                if rows is not None:
+                    results[key] = rows
+        pending = [key for key in unique if key not in results]
+
+        with limit_time(at=deadline):
+            cls._prefetch_sources([(name, authorship) for name, authorship, _ in pending])
+
+        for key in pending:
+            name, authorship, parent_taxa = key
+            rows = cls._match_all_sources(name, authorship, parent_taxa,
+                                          concurrent, deadline=deadline)
+            # Partial results are not cached, as in `from_all_sources`
+            if use_cache and not rows.partial:
+                _cached_from_all_sources.set_cached(cache_keys[key], rows)
+            results[key] = rows
+
+        out = []
+        returned = set()
+        for key in keys:
+            if key in returned:
+                out.append(copy.deepcopy(results[key]))
+                continue
+            returned.add(key)
+            out.append(results[key])
+        if columns is not None:
+            return cls.to_columns(out, columns)
+        return out
+
+    @classmethod
+    def _prefetch_sources(cls, records) -> None:
+        """
+        Fetch the Global Names and GBIF answers of `(name, authorship)`
+        records into the cache. Errors are left to the lookups that follow; a
+        failed Global Names batch is logged as its names then fall back to
+        single requests.
+        """
+        names = list(dict.fromkeys(records))
+        if not names:
+            return
+        executor = _get_executor()
+        futures = [executor.submit(
+            contextvars.copy_context().run, global_names.verify_many,
+            [name for name, _ in names], [authorship for _, authorship in names],
+            data_sources=DATA_SOURCES)]
+        futures.extend(
+            executor.submit(contextvars.copy_context().run, cls.from_gbif, name, authorship)
+            for name, authorship in names)
+        try:
+            futures[0].result()
+        except Exception as e:
+            logging.warning(f"Global Names batch verification failed, verifying names one by one: {e!r}")
+        for future in futures[1:]:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    @classmethod
+    def _match_all_sources(cls, name: str, authorship: str = None, parent_taxa: str = None,
+                           concurrent: Optional[bool] = None,
+                           time_budget: Optional[float] = None,
+                           deadline: Optional[float] = None):
+        if concurrent is None:
+            concurrent = CONCURRENT_SOURCES
+
+        # Same input as the cached path: whitespace collapsed, first letter
+        # capitalized
+        name = cache.normalize_name(name)
+        authorship = cache.normalize_name(authorship, capitalize=False) or None
+
+        with limit_time(time_budget, at=deadline):
+            out = cls._from_sources(name, authorship, concurrent)
+        missing_sources = out.missing_sources
         
         # Edge cases custom sources
         edge_cases = set()
@@ -409,7 +779,7 @@ class TaxaRef:
                 out_dict[ref.source_record_id] = ref
         
         # Extract values from the dictionary
-        out = list(out_dict.values()) 
+        out = SourceResults(out_dict.values(), missing_sources=missing_sources)
 
         return out
 
@@ -419,7 +789,7 @@ class TaxaRef:
         
         # Eliminate duplicates
         taxa_ref_list = {
-            str(ref.__dict__): ref for ref in taxa_ref_list
+            ref.key(): ref for ref in taxa_ref_list
             }.values()
 
         source_names = {ref.source_name for ref in taxa_ref_list}
@@ -620,6 +990,64 @@ class TaxaRef:
 
         return out
 
+def _canonical_result_args(name: str, authorship: str = None, parent_taxa: str = None,
+                           **kwargs):
+    """Arguments of `_cached_from_all_sources` in canonical form."""
+    if parent_taxa and not isinstance(parent_taxa, str):
+        # Pruning keeps the union of the branches, order does not matter
+        parent_taxa = tuple(sorted(set(parent_taxa)))
+        if len(parent_taxa) == 1:
+            parent_taxa = parent_taxa[0]
+    return (cache.normalize_name(name),
+            cache.normalize_name(authorship, capitalize=False) or None,
+            parent_taxa or None,
+            tuple(DATA_SOURCES),
+            cache.result_key_config()), kwargs
+
+
+@cache.memoize(negative=lambda out: not out, namespace="results",
+               normalize=_canonical_result_args,
+               ignore=("concurrent", "time_budget", "deadline"),
+               cache_if=lambda out: not out.partial)
+def _cached_from_all_sources(name, authorship, parent_taxa, data_sources, config, **kwargs):
+    return TaxaRef._match_all_sources(name, authorship, parent_taxa, **kwargs)
+
+
+def _numpy_columns(columns: dict) -> dict:
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("numpy is required for format='numpy'")
+    out = {}
+    for field, values in columns.items():
+        kind = COLUMN_TYPES[field]
+        if kind == "list<string>":
+            # Object array of lists, not a 2d array of ragged rows
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+        elif kind != "string" and None not in values:
+            array = np.array(values, dtype=kind)
+        else:
+            array = np.array(values, dtype=object)
+        out[field] = array
+    return out
+
+
+def _arrow_columns(columns: dict):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("pyarrow is required for format='arrow'")
+    types = {
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "list<string>": pa.list_(pa.string()),
+    }
+    schema = pa.schema([(field, types[kind]) for field, kind in COLUMN_TYPES.items()])
+    return pa.table(columns, schema=schema)
+
+
 def is_complex(name):
     return "|" in name
 
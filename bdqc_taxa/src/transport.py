@@ -0,0 +1,750 @@
+"""
+Shared HTTP transport for the bdqc_taxa remote clients.
+
+Keeps a pool of keep-alive connections per host so that the GBIF, Global
+Names, Wikidata and NatureServe clients reuse their TCP/TLS connections
+instead of opening a new one for every request. The pool is safe to share
+across threads.
+
+Usage:
+    from bdqc_taxa import transport
+
+    # Drop-in replacement for urllib.request.urlopen
+    resp = transport.urlopen(Request(url, headers=headers))
+    data = resp.read()
+
+    # Or build the request directly
+    resp = transport.request("GET", url, params={"q": "Acer"})
+
+    # Size the pool before (or between) bulk runs
+    transport.configure(pool_size=20, max_connections_per_host=20)
+
+    # Run a blocking client call from asyncio, bounded per host
+    out = await transport.run_async("api.gbif.org", gbif.Species.get, 2474953)
+
+Requests to each host are throttled by a token bucket and transient
+failures (connection errors, 429 and 5xx answers) are retried with jittered
+exponential backoff. The bucket slows down when a host answers 429 and
+honours its `Retry-After` header, then speeds back up to the configured rate:
+
+    transport.configure_host("api.gbif.org", rate=50, max_retries=5)
+
+Connections time out after `CONNECT_TIMEOUT` seconds and reads after
+`READ_TIMEOUT` seconds, both configurable per host. Within a
+`bdqc_taxa.deadline.deadline()` block, timeouts, waits and retries are
+also capped to the remaining time budget.
+
+Responses are requested gzip compressed and decompressed transparently.
+`loads()` decodes JSON with orjson when it is installed
+(`pip install bdqc_taxa[fast]`) and falls back to the standard library.
+
+Like `urllib.request.urlopen`, requests go through the proxies set in the
+`http_proxy` / `https_proxy` environment variables, except for the hosts
+listed in `no_proxy`. HTTPS requests are tunnelled with CONNECT. The
+environment is read when a host is first contacted, or after `configure()`.
+
+Errors are raised as `urllib.error.HTTPError` (status >= 400) and
+`urllib.error.URLError` (connection failures) so callers can keep their
+existing `urlopen` error handling.
+"""
+
+import asyncio
+import base64
+import contextvars
+import email.utils
+import os
+import functools
+import gzip
+import http.client
+import io
+import json
+import queue
+import random
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urlencode, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from . import deadline
+from .__about__ import __version__
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Number of idle keep-alive connections kept per host
+POOL_SIZE = 10
+
+# Maximum number of connections (idle and in use) opened per host at once
+MAX_CONNECTIONS_PER_HOST = 10
+
+MAX_REDIRECTS = 5
+
+# Default timeouts, in seconds, see `HostPolicy`
+CONNECT_TIMEOUT = float(os.environ.get("BDQC_TAXA_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.environ.get("BDQC_TAXA_READ_TIMEOUT", 30))
+
+# Worker threads running the blocking client calls awaited by `run_async`
+ASYNC_MAX_WORKERS = 32
+
+# Answers worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Throttling and retry settings, see `HostPolicy`. Hosts not listed here use
+# DEFAULT_POLICY, which retries but does not throttle.
+DEFAULT_POLICY = {
+    "rate": None,
+    "burst": None,
+    "max_retries": 3,
+    "backoff_base": 0.5,
+    "backoff_max": 30.0,
+    "connect_timeout": None,
+    "read_timeout": None,
+}
+HOST_POLICIES = {
+    "api.gbif.org": {"rate": 20.0},
+    "verifier.globalnames.org": {"rate": 10.0},
+    "www.wikidata.org": {"rate": 5.0},
+    "explorer.natureserve.org": {"rate": 5.0},
+}
+
+USER_AGENT = f"bdqc_taxa/{__version__} (https://biodiversite-quebec.ca/; info@biodiversite-quebec.ca)"
+
+ACCEPT_ENCODING = "gzip, deflate"
+
+# Errors raised by a kept-alive connection that the server closed in between
+# two requests. The request is replayed once on a fresh connection.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class Response:
+    """
+    Fully read HTTP response.
+
+    Mimics the parts of `http.client.HTTPResponse` used by the clients
+    (`read()`, `status`, `headers`) so it can stand in for `urlopen`'s return.
+    """
+    def __init__(self, url: str, status: int, reason: str, headers, data: bytes):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+
+    @property
+    def code(self):
+        return self.status
+
+    def read(self) -> bytes:
+        return self.data
+
+    def getcode(self) -> int:
+        return self.status
+
+    def json(self):
+        return loads(self.data)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.status}, '{self.url}')"
+
+
+def _sleep(seconds: float) -> None:
+    """Sleep, but raise `DeadlineExceeded` rather than outlive the deadline."""
+    left = deadline.remaining()
+    if left is not None and left < seconds:
+        time.sleep(max(left, 0))
+        deadline.check()
+    time.sleep(seconds)
+
+
+def loads(data):
+    """
+    Decode a JSON document from bytes or str.
+
+    Uses orjson when available, the standard library otherwise.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _decode_content(data: bytes, encoding: str = None) -> bytes:
+    encoding = (encoding or "").strip().lower()
+    if not data or encoding in ("", "identity"):
+        return data
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(data)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            # Raw deflate stream, without zlib header
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+    return data
+
+
+class HostPolicy:
+    """
+    Throttling and retry settings for a host.
+
+    Args:
+        rate: Maximum requests per second, None to disable throttling.
+        burst: Number of requests that can be sent at once after an idle
+            period. Defaults to `rate`.
+        max_retries: Number of times a transient failure is retried.
+        backoff_base: First retry waits up to this many seconds, doubling
+            with each attempt.
+        backoff_max: Upper bound of the wait between two attempts.
+        connect_timeout: Seconds to establish a connection, defaults to
+            `CONNECT_TIMEOUT`.
+        read_timeout: Seconds to wait for data on an open connection,
+            defaults to `READ_TIMEOUT`.
+    """
+    def __init__(self, rate: float = None, burst: float = None,
+                 max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, connect_timeout: float = None,
+                 read_timeout: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def timeouts(self, timeout: float = None):
+        """Return `(connect, read)` timeouts, `timeout` overriding both."""
+        if timeout is not None:
+            return timeout, timeout
+        return (
+            self.connect_timeout if self.connect_timeout is not None else CONNECT_TIMEOUT,
+            self.read_timeout if self.read_timeout is not None else READ_TIMEOUT)
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff before retry number `attempt`."""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all threads sending requests to a host.
+
+    `penalize()` halves the current rate (down to `min_rate`) and pauses the
+    host for `Retry-After` seconds; every successful request then raises the
+    rate a little until it is back to the configured maximum.
+    """
+    def __init__(self, rate: float = None, burst: float = None,
+                 min_rate: float = 0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(burst or 1.0, 1.0)
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if not self.rate:
+                return wait
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def acquire(self) -> None:
+        """
+        Wait for a token. Raises `DeadlineExceeded` right away, giving the
+        token back, if the wait would outlive the current deadline.
+        """
+        wait = self._reserve()
+        if wait <= 0:
+            return
+        left = deadline.remaining()
+        if left is not None and left < wait:
+            with self._lock:
+                if self.rate:
+                    self._tokens = min(self.burst, self._tokens + 1)
+            raise deadline.DeadlineExceeded("Time budget exhausted")
+        time.sleep(wait)
+
+    def penalize(self, retry_after: float = None) -> None:
+        with self._lock:
+            if self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + retry_after)
+
+    def reward(self) -> None:
+        with self._lock:
+            if self.rate and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def _retry_after(headers) -> float:
+    """Seconds to wait from a `Retry-After` header, None if absent."""
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def _proxy_for(scheme: str, host: str):
+    """
+    Proxy URL to reach `host` with, from the environment as urllib does,
+    None to connect directly.
+    """
+    proxy = getproxies().get(scheme)
+    if not proxy or proxy_bypass(host):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return proxy
+
+
+class HostPool:
+    """
+    Keep-alive connections to a single `scheme://host:port`.
+
+    At most `max_connections` connections exist at once; callers block until
+    one is released. Released connections are kept idle for reuse, up to
+    `pool_size` of them.
+
+    With a `proxy` URL, plain HTTP requests are sent to the proxy with their
+    absolute URL and HTTPS connections are tunnelled through it.
+    """
+    def __init__(self, scheme: str, netloc: str,
+                 pool_size: int = POOL_SIZE,
+                 max_connections: int = MAX_CONNECTIONS_PER_HOST,
+                 proxy: str = None):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.proxy = proxy
+        # Headers sent to the proxy (credentials)
+        self.proxy_headers = {}
+        if proxy:
+            parts = urlsplit(proxy)
+            if parts.username is not None:
+                credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+                self.proxy_headers["Proxy-Authorization"] = \
+                    "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self):
+        if self.proxy:
+            proxy = urlsplit(self.proxy)
+            proxy_netloc = proxy.hostname + (f":{proxy.port}" if proxy.port else "")
+            if self.scheme == "https":
+                conn = http.client.HTTPSConnection(proxy_netloc)
+                target = urlsplit(f"//{self.netloc}")
+                conn.set_tunnel(target.hostname, target.port,
+                                headers=self.proxy_headers or None)
+                return conn
+            return http.client.HTTPConnection(proxy_netloc)
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.netloc)
+        return http.client.HTTPConnection(self.netloc)
+
+    def acquire(self):
+        """
+        Return `(connection, reused)`, waiting for a free slot if needed,
+        at most until the current deadline.
+        """
+        if not self._slots.acquire(timeout=deadline.remaining()):
+            raise deadline.DeadlineExceeded(
+                f"No connection to {self.netloc} available in time")
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def release(self, conn, reusable: bool = True):
+        try:
+            if reusable:
+                try:
+                    self._idle.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class ConnectionPool:
+    """Thread-safe registry of `HostPool`, one per `scheme://host:port`."""
+    def __init__(self, pool_size: int = POOL_SIZE,
+                 max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST):
+        self.pool_size = pool_size
+        self.max_connections_per_host = max_connections_per_host
+        self._host_limits = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def set_host_limit(self, host: str, max_connections: int):
+        """Override `max_connections_per_host` for a single host name."""
+        with self._lock:
+            self._host_limits[host] = max_connections
+            for (scheme, netloc), pool in list(self._hosts.items()):
+                if netloc.split(":")[0] == host:
+                    pool.close()
+                    del self._hosts[(scheme, netloc)]
+
+    def host_limit(self, host: str) -> int:
+        return self._host_limits.get(host, self.max_connections_per_host)
+
+    def host_pool(self, scheme: str, netloc: str) -> HostPool:
+        key = (scheme, netloc)
+        try:
+            return self._hosts[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._hosts:
+                max_connections = self.host_limit(netloc.split(":")[0])
+                self._hosts[key] = HostPool(
+                    scheme, netloc,
+                    pool_size=min(self.pool_size, max_connections),
+                    max_connections=max_connections,
+                    proxy=_proxy_for(scheme, urlsplit(f"//{netloc}").hostname or ""))
+            return self._hosts[key]
+
+    def close(self):
+        with self._lock:
+            for pool in self._hosts.values():
+                pool.close()
+            self._hosts = {}
+
+    def request(self, method: str, url: str, body: bytes = None,
+                headers: dict = None, timeout=None) -> Response:
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise URLError(f"unknown url type: {urlsplit(url).scheme}")
+        headers = dict(headers or {})
+        header_names = {k.lower() for k in headers}
+        if "user-agent" not in header_names:
+            headers["User-Agent"] = USER_AGENT
+        if "accept-encoding" not in header_names:
+            headers["Accept-Encoding"] = ACCEPT_ENCODING
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self._request_with_retries(method, url, body, headers, timeout)
+            location = resp.headers.get("Location")
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                if resp.status == 303:
+                    method, body = "GET", None
+                continue
+            break
+        if resp.status >= 400:
+            raise HTTPError(url, resp.status, resp.reason, resp.headers,
+                            io.BytesIO(resp.data))
+        return resp
+
+    def _request_with_retries(self, method, url, body, headers, timeout) -> Response:
+        host = urlsplit(url).hostname or ""
+        policy = get_host_policy(host)
+        limiter = get_rate_limiter(host)
+        connect_timeout, read_timeout = policy.timeouts(timeout)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            deadline.check()
+            try:
+                resp = self._request_once(method, url, body, headers,
+                                          connect_timeout, read_timeout)
+            except URLError:
+                if attempt >= policy.max_retries:
+                    raise
+                _sleep(policy.backoff(attempt))
+                attempt += 1
+                continue
+
+            if resp.status not in RETRY_STATUSES:
+                limiter.reward()
+                return resp
+
+            retry_after = _retry_after(resp.headers)
+            if resp.status == 429:
+                limiter.penalize(retry_after)
+            if attempt >= policy.max_retries:
+                return resp
+            _sleep(max(retry_after or 0.0, policy.backoff(attempt)))
+            attempt += 1
+
+    def _request_once(self, method, url, body, headers, connect_timeout,
+                      read_timeout) -> Response:
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        pool = self.host_pool(parts.scheme, parts.netloc)
+        if pool.proxy and parts.scheme == "http":
+            # Forwarded by the proxy, which needs the absolute URL
+            path = f"http://{parts.netloc}{path}"
+            headers = {**headers, **pool.proxy_headers}
+
+        for attempt in range(2):
+            conn, reused = pool.acquire()
+            try:
+                if conn.sock is None:
+                    conn.timeout = deadline.cap_timeout(connect_timeout)
+                    conn.connect()
+                conn.sock.settimeout(deadline.cap_timeout(read_timeout))
+                conn.request(method, path, body=body, headers=headers)
+                raw = conn.getresponse()
+                data = raw.read()
+            except deadline.DeadlineExceeded:
+                pool.release(conn, reusable=False)
+                raise
+            except _STALE_CONNECTION_ERRORS as e:
+                pool.release(conn, reusable=False)
+                if reused and attempt == 0:
+                    continue
+                raise URLError(e)
+            except (OSError, http.client.HTTPException) as e:
+                pool.release(conn, reusable=False)
+                # Socket timeout caused by the time budget
+                deadline.check()
+                raise URLError(e)
+            except BaseException:
+                pool.release(conn, reusable=False)
+                raise
+            pool.release(conn, reusable=not raw.will_close)
+            try:
+                data = _decode_content(data, raw.headers.get("Content-Encoding"))
+            except (OSError, EOFError, zlib.error) as e:
+                raise URLError(f"Failed to decompress response: {e}")
+            return Response(url, raw.status, raw.reason, raw.headers, data)
+
+
+_pool = ConnectionPool()
+
+_host_policies = {}
+_rate_limiters = {}
+_policy_lock = threading.Lock()
+
+_async_executor = None
+_async_lock = threading.Lock()
+# {event loop: {host: asyncio.Semaphore}}, semaphores are bound to their loop
+_async_semaphores = weakref.WeakKeyDictionary()
+
+
+def _reinit_after_fork():
+    # A forked child (e.g. a multiprocessing worker) inherits the parent's
+    # sockets and possibly locks held by other threads: start over with
+    # fresh state, dropping the inherited connections without closing them
+    # as they are still in use by the parent
+    global _pool, _rate_limiters, _policy_lock
+    global _async_executor, _async_lock, _async_semaphores
+    inherited = _pool
+    _pool = ConnectionPool(
+        pool_size=inherited.pool_size,
+        max_connections_per_host=inherited.max_connections_per_host)
+    _pool._host_limits = dict(inherited._host_limits)
+    _rate_limiters = {}
+    _policy_lock = threading.Lock()
+    _async_executor = None
+    _async_lock = threading.Lock()
+    _async_semaphores = weakref.WeakKeyDictionary()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+def get_pool() -> ConnectionPool:
+    """Return the connection pool shared by all clients."""
+    return _pool
+
+
+def configure(pool_size: int = None, max_connections_per_host: int = None,
+              host_limits: dict = None) -> None:
+    """
+    Resize the shared connection pool.
+
+    Open connections are closed; the new limits apply to the next requests.
+
+    Args:
+        pool_size: Number of idle keep-alive connections kept per host.
+        max_connections_per_host: Maximum concurrent connections per host.
+        host_limits: Mapping of host name to its own maximum concurrent
+            connections, e.g. `{"api.gbif.org": 20}`.
+    """
+    global _pool
+    _pool.close()
+    _pool = ConnectionPool(
+        pool_size=pool_size if pool_size is not None else POOL_SIZE,
+        max_connections_per_host=max_connections_per_host
+            if max_connections_per_host is not None else MAX_CONNECTIONS_PER_HOST)
+    for host, limit in (host_limits or {}).items():
+        _pool.set_host_limit(host, limit)
+    with _async_lock:
+        _async_semaphores.clear()
+
+
+def get_host_policy(host: str) -> HostPolicy:
+    """Return the throttling and retry settings applied to `host`."""
+    try:
+        return _host_policies[host]
+    except KeyError:
+        pass
+    with _policy_lock:
+        if host not in _host_policies:
+            _host_policies[host] = HostPolicy(
+                **{**DEFAULT_POLICY, **HOST_POLICIES.get(host, {})})
+        return _host_policies[host]
+
+
+def get_rate_limiter(host: str) -> RateLimiter:
+    """Return the token bucket shared by requests to `host`."""
+    try:
+        return _rate_limiters[host]
+    except KeyError:
+        pass
+    policy = get_host_policy(host)
+    with _policy_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = RateLimiter(policy.rate, policy.burst)
+        return _rate_limiters[host]
+
+
+def configure_host(host: str, **settings) -> HostPolicy:
+    """
+    Change the throttling and retry settings of a host.
+
+    Args:
+        host: Host name, e.g. "api.gbif.org".
+        **settings: Any `HostPolicy` argument (rate, burst, max_retries,
+            backoff_base, backoff_max, connect_timeout, read_timeout). Unset
+            ones keep their current value.
+
+    Returns:
+        HostPolicy: The updated settings.
+    """
+    current = vars(get_host_policy(host))
+    unknown = set(settings) - set(current)
+    if unknown:
+        raise ValueError(f"Unknown host settings: {sorted(unknown)}")
+    if "rate" in settings and "burst" not in settings:
+        settings["burst"] = settings["rate"]
+    policy = HostPolicy(**{**current, **settings})
+    with _policy_lock:
+        _host_policies[host] = policy
+        _rate_limiters[host] = RateLimiter(policy.rate, policy.burst)
+    return policy
+
+
+def close() -> None:
+    """Close all idle pooled connections."""
+    _pool.close()
+
+
+def request(method: str, url: str, params: dict = None, body: bytes = None,
+            headers: dict = None, timeout=None) -> Response:
+    """
+    Send a request through the shared pool and return the read `Response`.
+
+    Args:
+        method: HTTP method, e.g. "GET" or "POST".
+        url: Absolute URL, may already contain a query string.
+        params: Query parameters appended to `url`.
+        body: Encoded request body.
+        headers: Request headers.
+        timeout: Connect and read timeout in seconds, overriding the host's
+            `connect_timeout` and `read_timeout`.
+    """
+    if params:
+        url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+    return _pool.request(method.upper(), url, body=body, headers=headers,
+                         timeout=timeout)
+
+
+def urlopen(req, timeout=None) -> Response:
+    """
+    Pooled replacement for `urllib.request.urlopen`.
+
+    Args:
+        req: A `urllib.request.Request` or a URL string.
+        timeout: Connect and read timeout in seconds, overriding the host's
+            `connect_timeout` and `read_timeout`.
+    """
+    if isinstance(req, str):
+        return request("GET", req, timeout=timeout)
+    return request(req.get_method(), req.full_url, body=req.data,
+                   headers=dict(req.header_items()), timeout=timeout)
+
+
+def _get_async_executor() -> ThreadPoolExecutor:
+    global _async_executor
+    with _async_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(
+                max_workers=ASYNC_MAX_WORKERS,
+                thread_name_prefix="bdqc_taxa")
+        return _async_executor
+
+
+def _get_async_semaphore(loop, host: str) -> asyncio.Semaphore:
+    with _async_lock:
+        semaphores = _async_semaphores.setdefault(loop, {})
+        if host not in semaphores:
+            semaphores[host] = asyncio.Semaphore(_pool.host_limit(host))
+        return semaphores[host]
+
+
+async def run_async(host: str, func, *args, **kwargs):
+    """
+    Await a blocking client call from asyncio.
+
+    The call runs in a worker thread, so it goes through the same connection
+    pool and the same cache entries as the sync API. At most as many calls as
+    the host's connection limit run at once; others wait on a per-host
+    semaphore without holding a worker thread.
+
+    Args:
+        host: Host name used to bound concurrency, e.g. "api.gbif.org".
+        func: Blocking function to run.
+        *args, **kwargs: Arguments passed to `func`.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    async with _get_async_semaphore(loop, host):
+        return await loop.run_in_executor(
+            _get_async_executor(),
+            functools.partial(context.run, func, *args, **kwargs))
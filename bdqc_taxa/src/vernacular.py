@@ -3,6 +3,8 @@ from . import bryoquel
 from . import cdpnq
 from . import eliso
 from . import wikidata
+from . import cache
+from .deadline import SourceResults, call_source, deadline as limit_time
 from typing import Optional
 import logging
 
@@ -237,22 +239,77 @@ class Vernacular:
                     authorship: Optional[str] = None,
                     rank: Optional[str] = None,
                     gbif_key: Optional[int] = None,
+                    time_budget: Optional[float] = None,
+                    deadline: Optional[float] = None,
+                    use_cache: Optional[bool] = None,
                     **match_kwargs):
-        out = []
+        """
+        Get vernacular names of a taxon from all sources.
+
+        `time_budget` (seconds) and `deadline` (`time.time()` timestamp) limit
+        the time spent on remote requests (GBIF, Wikidata). A source that runs
+        out of time is skipped and listed in `missing_sources` of the returned
+        `SourceResults`, whose `partial` attribute is then True.
+
+        If `use_cache` is True (default `cache.RESULT_CACHE`), the finished
+        list is cached in the "results" namespace, as
+        `TaxaRef.from_all_sources` does. Partial results are not cached.
+        """
+        if use_cache is None:
+            use_cache = cache.RESULT_CACHE
+        if use_cache:
+            return _cached_from_match(name, authorship, rank, gbif_key,
+                                      time_budget=time_budget, deadline=deadline,
+                                      **match_kwargs)
+        return cls._match_all_sources(name, authorship, rank, gbif_key,
+                                      time_budget, deadline, **match_kwargs)
+
+    @classmethod
+    def _match_all_sources(cls, name: str,
+                           authorship: Optional[str] = None,
+                           rank: Optional[str] = None,
+                           gbif_key: Optional[int] = None,
+                           time_budget: Optional[float] = None,
+                           deadline: Optional[float] = None,
+                           **match_kwargs):
+        # Same input as the cached path
+        name = cache.normalize_name(name)
+        authorship = cache.normalize_name(authorship, capitalize=False) or None
+        out = SourceResults()
+
+        with limit_time(time_budget, at=deadline):
+            if gbif_key:
+                # If a GBIF key is provided, use it to get vernacular names
+                out.extend(call_source(out, 'gbif', cls.from_gbif, gbif_key, rank=rank))
+            else:
+                # Otherwise, try to match the name with GBIF
+                out.extend(call_source(out, 'gbif', cls.from_gbif_match, name, authorship, rank, **match_kwargs))
+
+            # Get the first result rank to use as a fallback
+            if not rank and out:
+                rank = GBIF_RANKS[out[0].rank_order]
+
+            out.extend(cls.from_bryoquel_match(name))
+            out.extend(cls.from_cdpnq_match(name))
+            out.extend(cls.from_eliso_match(name))
+            out.extend(call_source(out, 'wikidata', cls.from_wikidata_match, name, rank = rank))
+        return out
+
 
-        if gbif_key:
-            # If a GBIF key is provided, use it to get vernacular names
-            out = [*out, *cls.from_gbif(gbif_key, rank=rank)]
-        else:
-            # Otherwise, try to match the name with GBIF
-            out = [*out, *cls.from_gbif_match(name, authorship, rank, **match_kwargs)]
+def _canonical_match_args(name: str, authorship: Optional[str] = None,
+                          rank: Optional[str] = None, gbif_key: Optional[int] = None,
+                          **kwargs):
+    """Arguments of `_cached_from_match` in canonical form."""
+    return (cache.normalize_name(name),
+            cache.normalize_name(authorship, capitalize=False) or None,
+            rank or None,
+            gbif_key or None,
+            cache.result_key_config()), kwargs
 
-        # Get the first result rank to use as a fallback
-        if not rank and out:
-            rank = GBIF_RANKS[out[0].rank_order]
 
-        out = [*out, *cls.from_bryoquel_match(name)]
-        out = [*out, *cls.from_cdpnq_match(name)]
-        out = [*out, *cls.from_eliso_match(name)]
-        out = [*out, *cls.from_wikidata_match(name, rank = rank)]
-        return out
\ No newline at end of file
+@cache.memoize(negative=lambda out: not out, namespace="results",
+               normalize=_canonical_match_args,
+               ignore=("time_budget", "deadline"),
+               cache_if=lambda out: not out.partial)
+def _cached_from_match(name, authorship, rank, gbif_key, config, **kwargs):
+    return Vernacular._match_all_sources(name, authorship, rank, gbif_key, **kwargs)
@@ -1,17 +1,24 @@
 import urllib.request
 import urllib.parse
-import json
 from typing import Union, List, Optional
-from .cache import cache
+from .cache import memoize, normalize_name
+from .transport import urlopen, run_async, loads
 
 
 BASE_URL = "https://www.wikidata.org/w/api.php?"
+HOST_NAME = "www.wikidata.org"
 
 TAXA_RANKS_QID = {'domain': 'Q146481', 'kingdom':'Q36732', 'subkingdom': 'Q2752679', 'infrakingdom': 'Q3150876', 'phylum': 'Q38348', 'subphylum': 'Q1153785', 'infraphylum': 'Q2361851', 'superclass': 'Q3504061', 'class': 'Q37517', 'subclass': 'Q5867051', 'infraclass': 'Q2007442', 'superorder': 'Q5868144', 'order': 'Q36602', 'suborder': 'Q5867959', 'infraorder': 'Q2889003', 'superfamily': 'Q2136103', 'family': 'Q35409', 'subfamily': 'Q164280', 'tribe': 'Q227936', 'subtribe': 'Q3965313', 'genus': 'Q34740', 'subgenus': 'Q3238261', 'species': 'Q7432', 'subspecies': 'Q68947', 'variety': 'Q767728', 'subvariety': 'Q630771', 'form': 'Q279749', 'subform': 'Q12774043'}
 # TAXA_RANKS_QID obtained from _get_taxa_rank_entities()
 
 
-@cache.memoize()
+def _canonical_search(query, language="en", rank: Optional[str] = None):
+    """Arguments of `search_entities` in canonical form, see `memoize`."""
+    return (normalize_name(query), language, rank), {}
+
+
+@memoize(negative=lambda results: not results, namespace="wikidata",
+         normalize=_canonical_search)
 def search_entities(query, language="en", rank:Optional[str] = None) -> list:
     """
     Search for entities on Wikidata based on a query.
@@ -39,8 +46,8 @@ def search_entities(query, language="en", rank:Optional[str] = None) -> list:
     url = BASE_URL + urllib.parse.urlencode(params)
     req = urllib.request.Request(url, headers=headers)
 
-    response = urllib.request.urlopen(req).read()
-    data = json.loads(response)
+    response = urlopen(req).read()
+    data = loads(response)
 
     # Raise an exception if the request was not successful
     if "error" in data:
@@ -50,7 +57,7 @@ def search_entities(query, language="en", rank:Optional[str] = None) -> list:
     return data["search"]
 
 
-@cache.memoize()
+@memoize(namespace="wikidata")
 def get_entities(id: Union[str, List[str]], languages=["en", "fr"]):
     """
     Get details of a specific entity from Wikidata based on its QID.
@@ -79,8 +86,8 @@ def get_entities(id: Union[str, List[str]], languages=["en", "fr"]):
     url = BASE_URL + urllib.parse.urlencode(params)
     req = urllib.request.Request(url, headers=headers)
 
-    response = urllib.request.urlopen(req).read()
-    data = json.loads(response)
+    response = urlopen(req).read()
+    data = loads(response)
 
     # Raise an exception if the request was not successful
     if "error" in data:
@@ -90,6 +97,20 @@ def get_entities(id: Union[str, List[str]], languages=["en", "fr"]):
     return list(data["entities"].values())
 
 
+async def search_entities_async(query, language="en", rank:Optional[str] = None) -> list:
+    """
+    Async version of `search_entities`, sharing its cache entries.
+    """
+    return await run_async(HOST_NAME, search_entities, query, language, rank)
+
+
+async def get_entities_async(id: Union[str, List[str]], languages=["en", "fr"]):
+    """
+    Async version of `get_entities`, sharing its cache entries.
+    """
+    return await run_async(HOST_NAME, get_entities, id, languages)
+
+
 def _get_taxa_rank_entities() -> dict:
     """
     Get the QID of a taxon rank entities based on the rank name.
@@ -0,0 +1,17 @@
+import shutil
+import tempfile
+
+from bdqc_taxa import cache
+
+
+def setUpModule():
+    # Run against a temporary cache, leaving the user's cache untouched
+    global _cache_dir, _cache_settings
+    _cache_dir = tempfile.mkdtemp()
+    _cache_settings = cache.configure(directory=_cache_dir)
+
+
+def tearDownModule():
+    cache.wait_for_refreshes(5)
+    cache.configure(**_cache_settings)
+    shutil.rmtree(_cache_dir, ignore_errors=True)
@@ -1,7 +1,9 @@
 # Test the bryoquel module
 
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
+from bdqc_taxa import bryoquel, cdpnq
 from bdqc_taxa.bryoquel import match_taxa
 
 class TestBryoquel(unittest.TestCase):
@@ -36,4 +38,16 @@ class TestBryoquel(unittest.TestCase):
 
     def test_no_match_taxon(self, name = 'Insecta'):
         result = match_taxa(name)
-        self.assertEqual(result, None)
\ No newline at end of file
+        self.assertEqual(result, None)
+
+    def test_match_from_other_thread(self, species='Aulacomnium palustre'):
+        with ThreadPoolExecutor(1) as pool:
+            result = pool.submit(match_taxa, species).result()
+        self.assertEqual(result['id'], "ID269")
+
+    def test_connection_per_thread(self):
+        # Modules on the same database share the thread's connection
+        self.assertIs(bryoquel.conn, cdpnq.conn)
+        with ThreadPoolExecutor(1) as pool:
+            other = pool.submit(bryoquel.connection, bryoquel.db_path).result()
+        self.assertIsNot(other, bryoquel.conn)
@@ -0,0 +1,491 @@
+import gzip
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bdqc_taxa import cache, deadline
+
+from . import setUpModule, tearDownModule  # noqa: F401
+
+
+calls = []
+
+
+@cache.memoize(negative=lambda value: value is None)
+def _lookup(name):
+    calls.append(name)
+    if name == 'error':
+        raise ValueError(name)
+    if name == 'unknown':
+        return None
+    return name.upper()
+
+
+@cache.memoize(namespace='test_source')
+def _source_lookup(name):
+    calls.append(name)
+    if name == 'down':
+        raise OSError(name)
+    return name.upper()
+
+
+class TestMemoize(unittest.TestCase):
+    def setUp(self):
+        cache.clear_cache_for_function(_lookup)
+        calls.clear()
+
+    def test_hit(self):
+        self.assertEqual(_lookup('acer'), 'ACER')
+        self.assertEqual(_lookup('acer'), 'ACER')
+        self.assertEqual(calls, ['acer'])
+
+    def test_errors_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                _lookup('error')
+        self.assertEqual(calls, ['error', 'error'])
+
+    def test_negative_cache(self):
+        self.assertIsNone(_lookup('unknown'))
+        self.assertIsNone(_lookup('unknown'))
+        self.assertEqual(calls, ['unknown'])
+        key = _lookup.__cache_key__('unknown')
+        self.assertNotIn(key, cache.cache)
+        self.assertIn(key, cache.negative_cache)
+
+    def test_answer_replaces_other_store(self):
+        key = _lookup.__cache_key__('acer')
+        _lookup.set_cached(key, 'ACER')
+        _lookup.set_cached(key, None)
+        self.assertNotIn(key, cache.cache)
+        cache.memory_cache.delete(key)
+        self.assertIsNone(_lookup.get_cached(key, 'MISSING'))
+        _lookup.set_cached(key, 'ACER')
+        self.assertNotIn(key, cache.negative_cache)
+        cache.memory_cache.delete(key)
+        self.assertEqual(_lookup.get_cached(key), 'ACER')
+
+    def test_negative_cache_expires(self):
+        key = _lookup.__cache_key__('unknown')
+        cache.negative_cache.set(key, None, expire=-1)
+        _lookup('unknown')
+        self.assertEqual(calls, ['unknown'])
+
+    def test_legacy_error_is_miss(self):
+        cache.cache.set(_lookup.__cache_key__('acer'), OSError('timeout'))
+        self.assertEqual(_lookup('acer'), 'ACER')
+
+    def test_memory_tier(self):
+        before = _lookup.cache_info()
+        _lookup('acer')
+        _lookup('acer')
+        cache.memory_cache.clear()
+        _lookup('acer')
+        _lookup('acer')
+        after = _lookup.cache_info()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['disk_hits'] - before['disk_hits'], 1)
+        self.assertEqual(after['memory_hits'] - before['memory_hits'], 2)
+        self.assertEqual(calls, ['acer'])
+
+    def test_memory_tier_returns_copies(self):
+        key = _lookup.__cache_key__('mutable')
+        _lookup.set_cached(key, {'results': [1]})
+        _lookup.get_cached(key)['results'].append(2)
+        self.assertEqual(_lookup.get_cached(key), {'results': [1]})
+
+    def test_clear_cache_for_function(self):
+        _lookup('acer')
+        cache.clear_cache_for_function(_lookup)
+        _lookup('acer')
+        self.assertEqual(calls, ['acer', 'acer'])
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        cache.clear_cache_for_function(_lookup)
+        cache.reset_cache_stats()
+
+    def test_function_stats(self):
+        _lookup('acer')
+        _lookup('acer')
+        info = _lookup.cache_info()
+        self.assertEqual((info['misses'], info['hits'], info['sets']), (1, 1, 1))
+        self.assertEqual(info['hit_ratio'], 0.5)
+        self.assertGreater(info['avg_value_size'], 0)
+
+    def test_cache_stats(self):
+        _lookup('acer')
+        stats = cache.get_cache_stats()
+        self.assertEqual(stats['functions'][_lookup.cache_base[0]]['sets'], 1)
+        self.assertGreaterEqual(stats['namespaces']['default']['sets'], 1)
+        self.assertGreaterEqual(stats['disk']['entries'], 1)
+        self.assertGreater(stats['disk']['volume_bytes'], 0)
+        cache.reset_cache_stats()
+        self.assertEqual(_lookup.cache_info()['sets'], 0)
+
+    def test_memory_evictions(self):
+        lru = cache.LRUCache(max_entries=1)
+        lru.set('a', 1, tag='x')
+        lru.set('b', 2, tag='y')
+        self.assertEqual(lru.evicted, {'x': 1})
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = cache.Cache(self.directory, disk=cache.CompressedDisk)
+        self.value = {'names': [{'name': f'Acer saccharum {i}', 'results': []} for i in range(200)]}
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_round_trip(self):
+        cache.reset_cache_stats()
+        self.store.set('key', self.value)
+        self.assertEqual(self.store.get('key'), self.value)
+        compression = cache.get_cache_stats()['compression']
+        self.assertEqual(compression['values'], 1)
+        self.assertGreater(compression['ratio'], 1)
+
+    def test_small_values_not_compressed(self):
+        self.store.set('key', {'name': 'Acer'})
+        self.assertEqual(self.store.get('key'), {'name': 'Acer'})
+        self.assertEqual(cache.Cache(self.directory).get('key'), {'name': 'Acer'})
+
+    def test_reads_uncompressed(self):
+        with cache.Cache(self.directory) as plain:
+            plain.set('key', self.value)
+        self.assertEqual(self.store.get('key'), self.value)
+
+    def test_disabled(self):
+        with mock.patch.object(cache, 'CACHE_COMPRESSION', 'none'):
+            self.store.set('key', self.value)
+        self.assertEqual(cache.Cache(self.directory).get('key'), self.value)
+
+
+class TestNormalize(unittest.TestCase):
+    def test_normalize_name(self):
+        self.assertEqual(cache.normalize_name(' canis   lupus\t'), 'Canis lupus')
+        self.assertEqual(cache.normalize_name(''), '')
+        self.assertIsNone(cache.normalize_name(None))
+
+    def test_memoize_normalize(self):
+        seen = []
+
+        @cache.memoize(normalize=lambda name: ((cache.normalize_name(name),), {}))
+        def lookup(name):
+            seen.append(name)
+            return name
+
+        cache.clear_cache_for_function(lookup)
+        self.assertEqual([lookup(v) for v in ('canis lupus', 'Canis  lupus ')],
+                         ['Canis lupus', 'Canis lupus'])
+        self.assertEqual(seen, ['Canis lupus'])
+
+    def test_result_key_config_content(self):
+        from bdqc_taxa import bryoquel
+        config = cache.result_key_config()
+        copy_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, copy_dir, ignore_errors=True)
+        self.addCleanup(cache.result_key_config.cache_clear)
+        path = shutil.copy(bryoquel.db_path, copy_dir)
+        # A reinstalled copy of the same database keeps the results
+        os.utime(path, (0, 0))
+        cache.result_key_config.cache_clear()
+        with mock.patch.object(bryoquel, 'db_path', path):
+            self.assertEqual(cache.result_key_config(), config)
+
+
+class TestSourcePolicy(unittest.TestCase):
+    def setUp(self):
+        cache.clear_cache_for_function(_source_lookup)
+        cache.set_source_policy('test_source', ttl=60, max_age=3600)
+        calls.clear()
+
+    def _store(self, name, value, age):
+        key = _source_lookup.__cache_key__(name)
+        cache.cache.set(key, value, tag=time.time() - age)
+        cache.memory_cache.delete(key)
+
+    def test_fresh(self):
+        self._store('acer', 'CACHED', 10)
+        self.assertEqual(_source_lookup('acer'), 'CACHED')
+        cache.wait_for_refreshes(5)
+        self.assertEqual(calls, [])
+
+    def test_stale_while_revalidate(self):
+        self._store('acer', 'CACHED', 120)
+        self.assertEqual(_source_lookup('acer'), 'CACHED')
+        self.assertTrue(cache.wait_for_refreshes(5))
+        self.assertEqual(calls, ['acer'])
+        self.assertEqual(_source_lookup('acer'), 'ACER')
+
+    def test_max_age_blocks(self):
+        self._store('acer', 'CACHED', 7200)
+        self.assertEqual(_source_lookup('acer'), 'ACER')
+        self.assertEqual(calls, ['acer'])
+
+    def test_max_age_source_down(self):
+        self._store('down', 'CACHED', 7200)
+        self.assertEqual(_source_lookup('down'), 'CACHED')
+
+    def test_legacy_entry_is_stale(self):
+        key = _source_lookup.__cache_key__('acer')
+        cache.cache.set(key, 'CACHED')
+        cache.memory_cache.delete(key)
+        self.assertEqual(_source_lookup('acer'), 'CACHED')
+        cache.wait_for_refreshes(5)
+        self.assertEqual(calls, ['acer'])
+
+    def test_env_policy(self):
+        with mock.patch.dict('os.environ', {'BDQC_TAXA_OTHER_TTL': '5',
+                                            'BDQC_TAXA_MAX_AGE': 'none'}):
+            self.assertEqual(cache.get_source_policy('other'),
+                             {'ttl': 5.0, 'max_age': None})
+        self.assertEqual(cache.get_source_policy(None),
+                         {'ttl': None, 'max_age': None})
+
+
+class TestShards(unittest.TestCase):
+    def test_sharded(self):
+        if cache.CACHE_SHARDS > 1:
+            self.assertIsInstance(cache.cache.open(), cache.FanoutCache)
+
+    def test_namespace_caches(self):
+        with mock.patch.object(cache, 'CACHE_PER_NAMESPACE', True):
+            store = cache.get_namespace_cache('test_namespace')
+            self.assertIs(cache.get_namespace_cache('test_namespace'), store)
+            self.assertIs(cache.get_namespace_cache(None), cache.cache)
+        store.set('key', 'value')
+        self.assertIn(store, cache._all_caches())
+        self.assertGreaterEqual(cache.get_cache_info()['entries'], 1)
+        cache.clear_cache()
+        self.assertNotIn('key', store)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        cache.clear_cache_for_function(_source_lookup)
+        self.path = os.path.join(tempfile.mkdtemp(), 'cache.snapshot')
+        self.key = _source_lookup.__cache_key__('acer')
+        _source_lookup.set_cached(self.key, 'SNAPSHOT')
+
+    def test_round_trip(self):
+        self.assertEqual(cache.export_snapshot(self.path, namespaces=['test_source']), 1)
+        cache.clear_cache_for_function(_source_lookup)
+        self.assertEqual(cache.import_snapshot(self.path), 1)
+        self.assertEqual(_source_lookup.get_cached(self.key), 'SNAPSHOT')
+
+    def test_filters(self):
+        self.assertEqual(cache.export_snapshot(self.path, namespaces=['other']), 0)
+        self.assertEqual(cache.export_snapshot(
+            self.path, namespaces=['test_source'], since=time.time() + 60), 0)
+        cache.export_snapshot(self.path, namespaces=['test_source'])
+        self.assertEqual(cache.import_snapshot(self.path, namespaces=['other']), 0)
+
+    def test_merge_keeps_newer(self):
+        cache.export_snapshot(self.path, namespaces=['test_source'])
+        _source_lookup.set_cached(self.key, 'NEWER')
+        self.assertEqual(cache.import_snapshot(self.path), 0)
+        self.assertEqual(_source_lookup.get_cached(self.key), 'NEWER')
+        self.assertEqual(cache.import_snapshot(self.path, merge=False), 1)
+        self.assertEqual(_source_lookup.get_cached(self.key), 'SNAPSHOT')
+
+    def test_not_a_snapshot(self):
+        with gzip.open(self.path, 'wb') as f:
+            pickle.dump([], f)
+        with self.assertRaises(ValueError):
+            cache.import_snapshot(self.path)
+
+
+class TestConfigure(unittest.TestCase):
+    def setUp(self):
+        settings = dict(directory=cache.CACHE_DIR, size_limit=cache.CACHE_SIZE_LIMIT,
+                        eviction_policy=cache.CACHE_EVICTION_POLICY,
+                        shards=cache.CACHE_SHARDS)
+        self.addCleanup(cache.configure, **settings)
+
+    def test_lazy_open(self):
+        directory = os.path.join(tempfile.mkdtemp(), 'bdqc_taxa')
+        cache.configure(directory=directory, size_limit=2 ** 20,
+                        eviction_policy='least-recently-used', shards=2)
+        self.assertFalse(cache.cache.is_open)
+        self.assertFalse(os.path.exists(directory))
+        _lookup('acer')
+        self.assertTrue(cache.cache.is_open)
+        self.assertEqual(cache.get_cache_path(), Path(directory))
+        self.assertEqual(cache.cache.eviction_policy, 'least-recently-used')
+        self.assertEqual(len(cache.cache), 1)
+
+    def test_unknown_eviction_policy(self):
+        with self.assertRaises(ValueError):
+            cache.configure(eviction_policy='random')
+
+
+class TestWarm(unittest.TestCase):
+    def setUp(self):
+        from bdqc_taxa import global_names
+        from bdqc_taxa.taxa_ref import TaxaRef
+        from bdqc_taxa.vernacular import Vernacular
+        patches = [
+            mock.patch.object(global_names, 'verify_many'),
+            mock.patch.object(TaxaRef, 'from_gbif'),
+            mock.patch.object(Vernacular, 'from_gbif_match'),
+            mock.patch.object(Vernacular, 'from_wikidata_match',
+                              side_effect=lambda name: 1 / (name != 'Broken')),
+        ]
+        self.verify_many, self.from_gbif, self.gbif_match, self.wikidata_match = \
+            [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def test_warm(self):
+        progress = []
+        report = cache.warm(['acer saccharum', 'Acer  saccharum', 'Broken'],
+                            progress=lambda done, total: progress.append(done))
+        self.assertEqual(report['names'], 2)
+        self.assertEqual(report['lookups'], 7)
+        self.assertEqual(progress[-1], 7)
+        self.verify_many.assert_called_once_with(['Acer saccharum', 'Broken'], [None, None])
+        self.from_gbif.assert_any_call('Acer saccharum', None)
+        self.assertEqual([(f['name'], f['source']) for f in report['failed']],
+                         [('Broken', 'wikidata')])
+
+    def test_warm_sources(self):
+        report = cache.warm(['Acer saccharum'], ['L.'], sources=['gbif'])
+        self.assertEqual(report['lookups'], 2)
+        self.from_gbif.assert_called_once_with('Acer saccharum', 'L.')
+        self.verify_many.assert_not_called()
+        with self.assertRaises(ValueError):
+            cache.warm(['Acer saccharum'], sources=['itis'])
+
+    def test_cli(self):
+        path = os.path.join(tempfile.mkdtemp(), 'names.txt')
+        with open(path, 'w') as f:
+            f.write('Acer saccharum\tMarshall\n\nPicea mariana\n')
+        with mock.patch('sys.stdout'), mock.patch('sys.stderr'):
+            self.assertEqual(cache.main(['warm', path, '--sources', 'global_names']), 0)
+        self.verify_many.assert_called_once_with(
+            ['Acer saccharum', 'Picea mariana'], ['Marshall', None])
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_max_entries(self):
+        lru = cache.LRUCache(max_entries=2, max_bytes=None)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.evictions, 1)
+
+    def test_max_bytes(self):
+        lru = cache.LRUCache(max_entries=None, max_bytes=250)
+        for i in range(10):
+            lru.set(i, 'x' * 100)
+        self.assertLessEqual(lru.size_bytes, 250)
+        self.assertEqual(lru.get(9), 'x' * 100)
+
+    def test_too_large_replaces(self):
+        lru = cache.LRUCache(max_entries=None, max_bytes=250)
+        lru.set('k', 'old')
+        lru.set('k', 'x' * 300)
+        self.assertIsNone(lru.get('k'))
+        self.assertEqual(lru.size_bytes, 0)
+
+    def test_expire(self):
+        lru = cache.LRUCache()
+        lru.set('a', 1, expire=-1)
+        self.assertIsNone(lru.get('a'))
+
+    def test_dict_keys(self):
+        lru = cache.LRUCache()
+        lru.set(('url', {'q': 'Acer'}), 1)
+        self.assertEqual(lru.get(('url', {'q': 'Acer'})), 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_coalesced(self):
+        flight = cache.SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: flight.do(('key', {'a': 1}), slow), range(8)))
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_error_shared(self):
+        flight = cache.SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(flight.do, 'key', fail)
+            started.wait()
+            second = pool.submit(flight.do, 'key', fail)
+            for future in (first, second):
+                with self.assertRaises(ValueError):
+                    future.result()
+
+    def test_leader_deadline_not_shared(self):
+        flight = cache.SingleFlight()
+        started = threading.Event()
+
+        def lookup():
+            started.set()
+            time.sleep(0.1)
+            deadline.check()
+            return 'value'
+
+        def lead():
+            with deadline.deadline(0.05):
+                return flight.do('key', lookup)
+
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(lead)
+            started.wait()
+            second = pool.submit(flight.do, 'key', lookup)
+            with self.assertRaises(deadline.DeadlineExceeded):
+                first.result()
+            self.assertEqual(second.result(), 'value')
+
+    def test_memoize_coalesces_misses(self):
+        cache.clear_cache_for_function(_slow_lookup)
+        slow_calls.clear()
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(_slow_lookup, ['acer'] * 8))
+        self.assertEqual(results, ['ACER'] * 8)
+        self.assertEqual(slow_calls, ['acer'])
+
+
+slow_calls = []
+
+
+@cache.memoize()
+def _slow_lookup(name):
+    slow_calls.append(name)
+    time.sleep(0.1)
+    return name.upper()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import time
+import unittest
+
+from bdqc_taxa import deadline
+
+
+class TestDeadline(unittest.TestCase):
+    def test_no_deadline(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.cap_timeout(10), 10)
+        deadline.check()
+
+    def test_time_budget(self):
+        with deadline.deadline(5):
+            self.assertLessEqual(deadline.remaining(), 5)
+            self.assertLessEqual(deadline.cap_timeout(30), 5)
+            self.assertEqual(deadline.cap_timeout(1), 1)
+        self.assertIsNone(deadline.remaining())
+
+    def test_absolute_deadline(self):
+        with deadline.deadline(at=time.time() + 2):
+            self.assertLessEqual(deadline.remaining(), 2)
+
+    def test_nested_deadline_only_shortens(self):
+        with deadline.deadline(1):
+            with deadline.deadline(60):
+                self.assertLessEqual(deadline.remaining(), 1)
+
+    def test_exceeded(self):
+        with deadline.deadline(0):
+            with self.assertRaises(deadline.DeadlineExceeded):
+                deadline.check()
+            with self.assertRaises(deadline.DeadlineExceeded):
+                deadline.cap_timeout(10)
+
+    def test_call_source(self):
+        def timed_out():
+            raise deadline.DeadlineExceeded()
+
+        results = deadline.SourceResults()
+        self.assertEqual(deadline.call_source(results, 'a', lambda: [1]), [1])
+        self.assertFalse(results.partial)
+        self.assertEqual(deadline.call_source(results, 'b', timed_out), [])
+        self.assertTrue(results.partial)
+        self.assertEqual(results.missing_sources, ['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
-from unittest import TestCase
+from unittest import TestCase, mock
+from bdqc_taxa import gbif
+from bdqc_taxa.cache import clear_cache_for_function
 from bdqc_taxa.gbif import Species
 from typing import List
 
+from . import setUpModule, tearDownModule  # noqa: F401
+
 
 class TestSpecies(TestCase):
     def test_get(self, key = 9036008):
@@ -78,6 +82,62 @@ class TestSpecies(TestCase):
         ]))
         self.assertTrue(result['usage']['rank'] == 'GENUS')
 
+    def test_match_async(self, name='Antigone canadensis'):
+        import asyncio
+        result = asyncio.run(Species.match_async(scientific_name=name))
+        self.assertEqual(result, Species.match(scientific_name=name))
+
+    def test_iter_vernacular_names(self, species_id=2474953):
+        results = list(Species.iter_vernacular_names(species_id, limit=5))
+        self.assertEqual(results, Species.get_vernacular_name(species_id))
+
+class TestPagination(TestCase):
+    def _fake_pages(self, n_records):
+        def fetch(url, params, limit=None, offset=0):
+            records = list(range(n_records))[offset:offset + limit]
+            return {'offset': offset, 'limit': limit, 'results': records,
+                    'endOfRecords': offset + limit >= n_records}
+        return mock.patch.object(gbif, '_fetch_url_data', side_effect=fetch)
+
+    def test_iter_url_data(self):
+        with self._fake_pages(25) as fetch:
+            records = list(gbif._iter_url_data('url', limit=10))
+        self.assertEqual(records, list(range(25)))
+        self.assertEqual([c.kwargs['offset'] for c in fetch.call_args_list], [0, 10, 20])
+        self.assertTrue(all(c.kwargs['limit'] == 10 for c in fetch.call_args_list))
+
+    def test_iter_url_data_stops_early(self):
+        with self._fake_pages(1000) as fetch:
+            records = gbif._iter_url_data('url', limit=10)
+            self.assertEqual(next(records), 0)
+            records.close()
+        # At most the first page and the prefetched one
+        self.assertLessEqual(fetch.call_count, 2)
+
+    def test_params_not_mutated(self):
+        params = {'q': 'Acer'}
+        with self._fake_pages(5):
+            list(gbif._iter_url_data('url', params, limit=10))
+        self.assertEqual(params, {'q': 'Acer'})
+
+class TestCacheKeys(TestCase):
+    def test_canonical_names_and_params(self):
+        url = f"{gbif.HOST}/v2/species/match"
+        key = gbif._fetch_url_data.__cache_key__(
+            url, {'scientificName': 'Canis lupus', 'strict': ''})
+        for params in ({'strict': '', 'scientificName': 'canis lupus '},
+                       {'scientificName': 'Canis  lupus', 'strict': ''}):
+            self.assertEqual(gbif._fetch_url_data.__cache_key__(url, params), key)
+
+    def test_fetch_does_not_mutate_params(self):
+        params = {'q': 'Acer'}
+        resp = mock.Mock(**{'read.return_value': b'{"results": [1]}'})
+        with mock.patch.object(gbif, 'urlopen', return_value=resp) as urlopen:
+            clear_cache_for_function(gbif._fetch_url_data)
+            gbif._fetch_url_data(f"{gbif.HOST}/v1/species/search", params, limit=10)
+        self.assertEqual(params, {'q': 'Acer'})
+        self.assertIn('limit=10', urlopen.call_args.args[0].full_url)
+
 if __name__ == '__main__':
     import unittest
 
@@ -1,5 +1,10 @@
 from bdqc_taxa import global_names
-from unittest import TestCase
+from bdqc_taxa.cache import clear_cache_for_function
+from unittest import TestCase, mock
+from concurrent.futures import ThreadPoolExecutor
+
+from . import setUpModule, tearDownModule  # noqa: F401
+
 
 class TestGlobalNames(TestCase):
     def test_verify(self, name = 'Acer saccharum'):
@@ -35,3 +40,63 @@ class TestGlobalNames(TestCase):
         self.assertTrue(len(set(data_source_ids)) == len(result))
 
         
+
+    def test_verify_many(self, names = ['Acer saccharum', 'Trillium erythrocarpum', 'Acer saccharum'], authorships = [None, 'Michx.', None]):
+        results = global_names.verify_many(names, authorships)
+        self.assertEqual(len(results), len(names))
+        for name, authorship, result in zip(names, authorships, results):
+            self.assertEqual(result['names'], global_names.verify(name, authorship)['names'])
+
+    def _patch_post_verify(self, fail_on=None):
+        """
+        Patch `_post_verify` to answer an exact match per name string, without
+        network. Batches holding the name string `fail_on` raise OSError.
+        """
+        def post_verify(batch, *args):
+            if fail_on in batch:
+                raise OSError('verifier down')
+            return {'metadata': {}, 'names': [
+                {'name': name_string, 'matchType': 'Exact', 'results': []} for name_string in batch]}
+        return mock.patch.object(global_names, '_post_verify', side_effect=post_verify)
+
+    def test_verify_many_fills_cache(self):
+        names = ['Picea mariana', 'Picea glauca | Picea rubens']
+        with self._patch_post_verify() as post:
+            clear_cache_for_function(global_names._verify)
+            results = global_names.verify_many(names)
+            self.assertEqual(post.call_count, 1)
+            self.assertEqual([v['name'] for v in results[1]['names']], ['Picea glauca', 'Picea rubens'])
+            # Single lookups are now served from the cache
+            self.assertEqual(global_names.verify(names[0])['names'][0]['name'], 'Picea mariana')
+            global_names.verify_many(names)
+            self.assertEqual(post.call_count, 1)
+            # Near-duplicate names share the cache entry
+            global_names.verify_many(['picea  mariana '])
+            self.assertEqual(post.call_count, 1)
+
+    def test_verify_many_failed_batch(self):
+        names = ['Picea mariana', 'Picea glauca | Picea rubens', 'Larix laricina', 'Abies balsamea']
+        clear_cache_for_function(global_names._verify)
+        with mock.patch.object(global_names, 'BATCH_SIZE', 2), \
+                self._patch_post_verify(fail_on='Abies balsamea'):
+            with self.assertRaises(OSError):
+                global_names.verify_many(names)
+        # Batches answered before the failure are cached
+        cached = lambda name: global_names._verify.get_cached(global_names._verify.__cache_key__(name))
+        self.assertIsNotNone(cached('Picea mariana'))
+        self.assertIsNotNone(cached('Picea glauca | Picea rubens'))
+        self.assertIsNotNone(cached('Larix laricina'))
+        self.assertIsNone(cached('Abies balsamea'))
+
+    def test_verify_members(self):
+        with self._patch_post_verify() as post:
+            clear_cache_for_function(global_names._verify)
+            global_names.verify_many(['Picea glauca | Picea rubens', 'Picea mariana'])
+        # Members are cached on their own by `verify_many` and shared
+        # between complex names
+        with mock.patch.object(global_names, 'urlopen') as urlopen, ThreadPoolExecutor(2) as executor:
+            result = global_names.verify_members('Picea rubens | Picea mariana')
+            self.assertEqual([v['name'] for v in result['names']], ['Picea rubens', 'Picea mariana'])
+            result = global_names.verify_members('Picea mariana|Picea glauca', executor=executor)
+            self.assertEqual([v['name'] for v in result['names']], ['Picea mariana', 'Picea glauca'])
+            urlopen.assert_not_called()
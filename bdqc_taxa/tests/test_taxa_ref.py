@@ -1,8 +1,14 @@
+import importlib.util
+import time
 import unittest
+from unittest import mock
 
-from bdqc_taxa import bryoquel, taxa_ref
+from bdqc_taxa import bryoquel, taxa_ref, cache
+from bdqc_taxa.deadline import SourceResults
 from bdqc_taxa import global_names
 
+from . import setUpModule, tearDownModule  # noqa: F401
+
 
 class TestFindAuthorship(unittest.TestCase):
     def test_species_author(self):
@@ -41,6 +47,90 @@ class TestTaxaRef(unittest.TestCase):
         tr = taxa_ref.TaxaRef(name)
         self.assertTrue(isinstance(tr.__dict__, dict))
 
+    def test_slots(self):
+        tr = taxa_ref.TaxaRef(scientific_name='Acer saccharum', rank='Species')
+        self.assertFalse(hasattr(tr, '__weakref__'))
+        with self.assertRaises(AttributeError):
+            tr.unknown = 1
+
+    def test_to_dict_to_tuple(self):
+        tr = taxa_ref.TaxaRef(scientific_name='Acer saccharum', rank='Species',
+                              classification_srids=['1', '2'])
+        self.assertEqual(list(tr.to_dict()), list(taxa_ref.TaxaRef.FIELDS))
+        self.assertEqual(tr.to_dict(), vars(tr))
+        self.assertEqual(tr.to_tuple(), tuple(vars(tr).values()))
+
+    def test_key(self):
+        refs = [taxa_ref.TaxaRef(scientific_name='Acer saccharum',
+                                 classification_srids=['1', '2'])
+                for _ in range(2)]
+        self.assertEqual(len({ref.key() for ref in refs}), 1)
+        refs[1].match_type = 'complex'
+        self.assertEqual(len({ref.key() for ref in refs}), 2)
+
+    def test_interned_strings(self):
+        refs = [taxa_ref.TaxaRef(scientific_name='Acer saccharum',
+                                 source_name=''.join(['GB', 'IF']),
+                                 rank=''.join(['Spe', 'cies']))
+                for _ in range(2)]
+        self.assertIs(refs[0].source_name, refs[1].source_name)
+        self.assertIs(refs[0].rank, refs[1].rank)
+
+    def test_pickle(self):
+        import pickle
+        tr = taxa_ref.TaxaRef(scientific_name='Acer saccharum', source_name='GBIF',
+                              classification_srids=['1', '2'])
+        copy = pickle.loads(pickle.dumps(tr))
+        self.assertEqual(vars(copy), vars(tr))
+        self.assertIs(copy.source_name, tr.source_name)
+
+    def _column_refs(self):
+        return [
+            [taxa_ref.TaxaRef(scientific_name='Acer saccharum', source_id=11,
+                              source_record_id=3189870, rank='species', rank_order=6,
+                              classification_srids=[6, 3189870], valid=True,
+                              valid_srid=3189870, match_type='exact', is_parent=False),
+             taxa_ref.TaxaRef(scientific_name='Acer', source_id=11,
+                              source_record_id=3189834, rank='genus', rank_order=5,
+                              classification_srids=[6], valid=True,
+                              valid_srid=3189834, is_parent=True)],
+            [],
+            [taxa_ref.TaxaRef(scientific_name='Lestes vigilax', source_id=1002,
+                              source_record_id='lestes vigilax', rank='species',
+                              classification_srids=None, valid=True)]]
+
+    def test_to_columns(self):
+        columns = taxa_ref.TaxaRef.to_columns(self._column_refs())
+        self.assertEqual(list(columns), list(taxa_ref.COLUMN_TYPES))
+        self.assertEqual(columns['input_index'], [0, 0, 2])
+        self.assertEqual(columns['source_record_id'], ['3189870', '3189834', 'lestes vigilax'])
+        self.assertEqual(columns['classification_srids'], [['6', '3189870'], ['6'], None])
+
+    def test_to_columns_flat(self):
+        columns = taxa_ref.TaxaRef.to_columns(self._column_refs()[0])
+        self.assertEqual(columns['input_index'], [0, 0])
+        self.assertEqual(columns['scientific_name'], ['Acer saccharum', 'Acer'])
+
+    def test_to_columns_unknown_format(self):
+        with self.assertRaises(ValueError):
+            taxa_ref.TaxaRef.to_columns([], 'csv')
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy not installed')
+    def test_to_columns_numpy(self):
+        columns = taxa_ref.TaxaRef.to_columns(self._column_refs(), 'numpy')
+        self.assertEqual(columns['input_index'].dtype.name, 'int64')
+        self.assertEqual(columns['source_id'].tolist(), [11, 11, 1002])
+        self.assertEqual(columns['rank_order'].dtype.name, 'object')
+        self.assertEqual(columns['classification_srids'][1], ['6'])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_to_columns_arrow(self):
+        table = taxa_ref.TaxaRef.to_columns(self._column_refs(), 'arrow')
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(str(table.schema.field('classification_srids').type), 'list<item: string>')
+        self.assertEqual(table.column('classification_srids').to_pylist(),
+                         [['6', '3189870'], ['6'], None])
+
     def test_repr(self):
         name = 'Lasiurus cinereus'
         tr = taxa_ref.TaxaRef(name)
@@ -75,6 +165,15 @@ class TestTaxaRef(unittest.TestCase):
     def test_from_global_names_no_match(self, name='Vincent Beauregard'):
         refs = taxa_ref.TaxaRef.from_global_names(name)
         self.assertFalse(refs)
+
+    def test_from_global_names_many(self, names=['Acer saccharum', 'Vincent Beauregard']):
+        refs_list = taxa_ref.TaxaRef.from_global_names_many(names)
+        self.assertEqual(len(refs_list), len(names))
+        for name, refs in zip(names, refs_list):
+            self.assertEqual(
+                [vars(ref) for ref in refs],
+                [vars(ref) for ref in taxa_ref.TaxaRef.from_global_names(name)])
+        self.assertFalse(refs_list[1])
     
     def test_from_cdpnq(self, name='Lestes vigilax'):
         refs = taxa_ref.TaxaRef.from_cdpnq(name)
@@ -185,6 +284,118 @@ class TestTaxaRef(unittest.TestCase):
         refs = taxa_ref.TaxaRef.from_all_sources(name)
         self.assertTrue(len(refs) > 1)
 
+    def test_from_all_sources_concurrent(self, names = ['Acer saccharum', 'Libellula julia', 'Acer rubrum | Acer saccharum']):
+        for name in names:
+            serial = taxa_ref.TaxaRef.from_all_sources(name, concurrent=False)
+            concurrent = taxa_ref.TaxaRef.from_all_sources(name, concurrent=True)
+            self.assertEqual([vars(ref) for ref in serial], [vars(ref) for ref in concurrent])
+
+    def test_from_all_sources_time_budget(self, name='Libellula luctuosa'):
+        refs = taxa_ref.TaxaRef.from_all_sources(name, time_budget=0)
+        self.assertTrue(refs.partial)
+        self.assertEqual(refs.missing_sources, ['global_names', 'gbif'])
+        # Local sources are still matched
+        self.assertTrue(any(ref.source_name == 'CDPNQ' for ref in refs))
+
+    def test_from_all_sources_many(self, records = [('Acer saccharum', None, None), ('Libellula julia', 'Uhler, 1857', None), ('Acer rubrum | Acer saccharum', None, None), ('Acer saccharum', None, None)]):
+        results = taxa_ref.TaxaRef.from_all_sources_many(records)
+        self.assertEqual(len(results), len(records))
+        for record, refs in zip(records, results):
+            expected = taxa_ref.TaxaRef.from_all_sources(*record)
+            self.assertEqual([vars(ref) for ref in refs], [vars(ref) for ref in expected])
+
+    def _patch_local_sources(self):
+        """Patch `_from_sources` to only query CDPNQ, without network."""
+        local_sources = lambda name, authorship=None, concurrent=False: SourceResults(taxa_ref.TaxaRef.from_cdpnq(name))
+        return mock.patch.object(taxa_ref.TaxaRef, '_from_sources', side_effect=local_sources)
+
+    def test_from_all_sources_many_dedup(self):
+        records = ['Libellula luctuosa', (' libellula  luctuosa', None), ('Aeshna eremita', None, 'Odonata')]
+        with self._patch_local_sources() as from_sources, \
+                mock.patch.object(taxa_ref.TaxaRef, '_prefetch_sources') as prefetch:
+            results = taxa_ref.TaxaRef.from_all_sources_many(records)
+            expected = [taxa_ref.TaxaRef.from_all_sources(name, authorship, parent_taxa)
+                        for name, authorship, parent_taxa in [(records[0], None, None), records[1] + (None,), records[2]]]
+        prefetch.assert_called_once_with([('Libellula luctuosa', None), ('Aeshna eremita', None)])
+        self.assertEqual(from_sources.call_count, 2 + 3)
+        self.assertEqual([[vars(ref) for ref in refs] for refs in results],
+                         [[vars(ref) for ref in refs] for refs in expected])
+        self.assertIsNot(results[0], results[1])
+
+    def test_from_all_sources_many_prefetch_misses(self):
+        cache.clear_cache_for_function(taxa_ref._cached_from_all_sources)
+        with self._patch_local_sources(), \
+                mock.patch.object(taxa_ref.TaxaRef, '_prefetch_sources') as prefetch:
+            refs = taxa_ref.TaxaRef.from_all_sources('Libellula luctuosa', use_cache=True)
+            info = taxa_ref._cached_from_all_sources.cache_info()
+            results = taxa_ref.TaxaRef.from_all_sources_many(['Libellula luctuosa', 'Aeshna eremita'], use_cache=True)
+            cached = taxa_ref.TaxaRef.from_all_sources('Aeshna eremita', use_cache=True)
+        # Rows already in the result cache are not prefetched
+        prefetch.assert_called_once_with([('Aeshna eremita', None)])
+        self.assertEqual([vars(ref) for ref in results[0]], [vars(ref) for ref in refs])
+        self.assertEqual([vars(ref) for ref in results[1]], [vars(ref) for ref in cached])
+        # Each row is looked up once: a hit, then a miss stored in the cache
+        after = taxa_ref._cached_from_all_sources.cache_info()
+        self.assertEqual(after['hits'] - info['hits'], 1 + 1)
+        self.assertEqual(after['misses'] - info['misses'], 1)
+        self.assertEqual(after['sets'] - info['sets'], 1)
+
+    def test_from_all_sources_many_columns(self):
+        records = ['Libellula luctuosa', 'Aeshna eremita', 'Libellula luctuosa']
+        with self._patch_local_sources(), \
+                mock.patch.object(taxa_ref.TaxaRef, '_prefetch_sources'):
+            results = taxa_ref.TaxaRef.from_all_sources_many(records)
+            columns = taxa_ref.TaxaRef.from_all_sources_many(records, columns='dict')
+        self.assertEqual(columns, taxa_ref.TaxaRef.to_columns(results))
+        self.assertEqual(sorted(set(columns['input_index'])), [0, 1, 2])
+
+    def test_from_all_sources_many_time_budget(self, name='Libellula luctuosa'):
+        results = taxa_ref.TaxaRef.from_all_sources_many([name], time_budget=0)
+        self.assertEqual(results[0].missing_sources, ['global_names', 'gbif'])
+
+    def test_from_all_sources_result_cache(self, name='Libellula luctuosa'):
+        cache.clear_cache_for_function(taxa_ref._cached_from_all_sources)
+        with self._patch_local_sources() as from_sources:
+            refs = taxa_ref.TaxaRef.from_all_sources(name, use_cache=True)
+            cached = taxa_ref.TaxaRef.from_all_sources(' libellula  luctuosa', use_cache=True)
+            self.assertEqual(from_sources.call_count, 1)
+        self.assertTrue(refs)
+        self.assertEqual([vars(ref) for ref in refs], [vars(ref) for ref in cached])
+
+    def test_from_all_sources_use_cache_same_output(self):
+        for name in ['Libellula  luctuosa', 'libellula luctuosa']:
+            cache.clear_cache_for_function(taxa_ref._cached_from_all_sources)
+            with self._patch_local_sources():
+                cached = taxa_ref.TaxaRef.from_all_sources(name, use_cache=True)
+                uncached = taxa_ref.TaxaRef.from_all_sources(name, use_cache=False)
+            self.assertTrue(cached)
+            self.assertEqual([vars(ref) for ref in cached], [vars(ref) for ref in uncached])
+
+    def test_from_all_sources_result_refresh(self, name='Libellula luctuosa'):
+        cache.clear_cache_for_function(taxa_ref._cached_from_all_sources)
+        self.addCleanup(cache.set_source_policy, 'results', **cache.get_source_policy('results'))
+        match_all_sources = taxa_ref.TaxaRef._match_all_sources
+        with self._patch_local_sources(), \
+                mock.patch.object(taxa_ref.TaxaRef, '_match_all_sources', side_effect=match_all_sources) as match:
+            refs = taxa_ref.TaxaRef.from_all_sources(name, use_cache=True)
+            sets = taxa_ref._cached_from_all_sources.cache_info()['sets']
+            cache.set_source_policy('results', ttl=0)
+            stale = taxa_ref.TaxaRef.from_all_sources(name, use_cache=True, deadline=time.time() + 60)
+            self.assertTrue(cache.wait_for_refreshes(5))
+        self.assertEqual([vars(ref) for ref in stale], [vars(ref) for ref in refs])
+        # Refreshed in a worker thread (local sqlite sources included),
+        # without the caller's deadline
+        self.assertEqual(match.call_count, 2)
+        self.assertNotIn('deadline', match.call_args.kwargs)
+        self.assertEqual(taxa_ref._cached_from_all_sources.cache_info()['sets'], sets + 1)
+
+    def test_from_all_sources_partial_not_cached(self, name='Libellula luctuosa'):
+        cache.clear_cache_for_function(taxa_ref._cached_from_all_sources)
+        refs = taxa_ref.TaxaRef.from_all_sources(name, time_budget=0, use_cache=True)
+        self.assertTrue(refs.partial)
+        key = taxa_ref._cached_from_all_sources.__cache_key__(name)
+        self.assertIsNone(taxa_ref._cached_from_all_sources.get_cached(key))
+
     def test_from_gbif(self, name='Acer saccharum'):
         refs = taxa_ref.TaxaRef.from_gbif(name)
         self.assertTrue(len(refs) > 1)
@@ -626,6 +837,29 @@ class TestComplex(unittest.TestCase):
         cdpnq_refs = [ref for ref in refs if ref.source_name == 'CDPNQ' and ref.match_type == 'complex' and ref.valid and ref.rank == 'species']
         self.assertEqual(len(cdpnq_refs), 2)
 
+    def test_from_gbif_complex_members_parallel(self, name='Myotis lucifugus | Myotis septentrionalis | Myotis leibii'):
+        def singleton(name, authorship=None):
+            time.sleep(0.2)
+            return [taxa_ref.TaxaRef(name)]
+        with mock.patch.object(taxa_ref.TaxaRef, '_from_gbif_singleton', side_effect=singleton):
+            start = time.monotonic()
+            refs = taxa_ref.TaxaRef.from_gbif(name)
+            elapsed = time.monotonic() - start
+        self.assertEqual([ref.scientific_name for ref in refs],
+                         ['Myotis lucifugus', 'Myotis septentrionalis', 'Myotis leibii'])
+        self.assertLess(elapsed, 0.5)
+
+    def test_from_gbif_complex_on_shared_executor(self, name='Myotis lucifugus | Myotis leibii'):
+        # Complex lookups submitted to a saturated source pool must not
+        # wait on member tasks queued behind them
+        singleton = lambda name, authorship=None: [taxa_ref.TaxaRef(name)]
+        with mock.patch.object(taxa_ref.TaxaRef, '_from_gbif_singleton', side_effect=singleton):
+            executor = taxa_ref._get_executor()
+            futures = [executor.submit(taxa_ref.TaxaRef.from_gbif, name)
+                       for _ in range(taxa_ref.MAX_WORKERS * 2)]
+            for future in futures:
+                self.assertEqual(len(future.result(timeout=10)), 2)
+
     def test_complex_is_true(self,
                              name='Lasiurus cinereus|Lasionycteris noctivagans'):
         out = taxa_ref.is_complex(name)
@@ -700,6 +934,37 @@ class TestComplex(unittest.TestCase):
         self.assertTrue(len(refs) >= 1)
 
 class TestParent(unittest.TestCase):
+    def _salix_refs(self):
+        # Salix as a plant genus (GBIF) and a tunicate genus (GBIF), plus VASCAN
+        # rows without the branch down from the kingdom
+        def ref(name, srids, source_name='GBIF Backbone Taxonomy'):
+            return taxa_ref.TaxaRef(name, source_name=source_name, source_record_id=srids[-1],
+                                    classification_srids=srids, valid_srid=srids[-1])
+        return [
+            ref('Plantae', [6]), ref('Tracheophyta', [6, 7707728]),
+            ref('Salix', [6, 7707728, 3040]),
+            ref('Animalia', [1]), ref('Chordata', [1, 44]), ref('Salix', [1, 44, 9000]),
+            ref('Salix', ['73', '1058'], 'VASCAN')]
+
+    def test_prune_parent_taxa(self):
+        refs = taxa_ref.TaxaRef._prune_parent_taxa(self._salix_refs(), 'Plantae')
+        self.assertEqual([ref.valid_srid for ref in refs], [6, 7707728, 3040, '1058'])
+        refs = taxa_ref.TaxaRef._prune_parent_taxa(self._salix_refs(), 'Chordata')
+        self.assertEqual([ref.valid_srid for ref in refs], [1, 44, 9000])
+
+    def test_prune_parent_taxa_list(self):
+        refs = self._salix_refs()
+        pruned = taxa_ref.TaxaRef._prune_parent_taxa(refs, ['Tracheophyta', 'Chordata'])
+        self.assertEqual(len(pruned), len(refs))
+        self.assertEqual(taxa_ref.TaxaRef._prune_parent_taxa(refs, ['Plantae']),
+                         taxa_ref.TaxaRef._prune_parent_taxa(refs, 'Plantae'))
+
+    def test_parent_taxa_list_cache_key(self):
+        args, _ = taxa_ref._canonical_result_args('Salix', parent_taxa=['Plantae', 'Animalia', 'Plantae'])
+        self.assertEqual(args[2], ('Animalia', 'Plantae'))
+        args, _ = taxa_ref._canonical_result_args('Salix', parent_taxa=['Plantae'])
+        self.assertEqual(args[2], 'Plantae')
+
     # Test case for Salix matching for a genus of Animalia and a genus of Plantae
     def test_from_all_sources_parent_taxa_salix(self, name='Salix', parent_taxa = 'Plantae'):
         refs = taxa_ref.TaxaRef.from_all_sources(name, parent_taxa = parent_taxa)
@@ -1,6 +1,10 @@
-from unittest import TestCase, result
+from unittest import TestCase, mock, result
+from bdqc_taxa import cache, vernacular
 from bdqc_taxa.vernacular import Vernacular, initcap_vernacular
 
+from . import setUpModule, tearDownModule  # noqa: F401
+
+
 class TestVernacular(TestCase):
     def assertVernacularList(self, results):
         self.assertTrue(results.__len__() >= 1)
@@ -104,6 +108,38 @@ class TestVernacular(TestCase):
         results = Vernacular.from_cdpnq_match(name)
         self.assertFalse(results)
 
+    def test_from_match_time_budget(self, name = 'Libellula luctuosa'):
+        results = Vernacular.from_match(name, time_budget = 0)
+        self.assertTrue(results.partial)
+        self.assertEqual(results.missing_sources, ['gbif', 'wikidata'])
+        self.assertTrue(any([vn.source == 'CDPNQ' for vn in results]))
+
+    def test_from_match_result_cache(self, name = 'Libellula luctuosa'):
+        cache.clear_cache_for_function(vernacular._cached_from_match)
+        with mock.patch.object(Vernacular, 'from_gbif_match', return_value=[]) as gbif_match, \
+                mock.patch.object(Vernacular, 'from_wikidata_match', return_value=[]):
+            results = Vernacular.from_match(name, use_cache = True)
+            cached = Vernacular.from_match(name.lower(), use_cache = True)
+            self.assertEqual(gbif_match.call_count, 1)
+        self.assertTrue(any([vn.source == 'CDPNQ' for vn in cached]))
+        self.assertEqual([vars(vn) for vn in results], [vars(vn) for vn in cached])
+
+        # Partial results are not cached
+        cache.clear_cache_for_function(vernacular._cached_from_match)
+        Vernacular.from_match(name, time_budget = 0, use_cache = True)
+        key = vernacular._cached_from_match.__cache_key__(name)
+        self.assertIsNone(vernacular._cached_from_match.get_cached(key))
+
+    def test_from_match_use_cache_same_output(self):
+        with mock.patch.object(Vernacular, 'from_gbif_match', return_value=[]), \
+                mock.patch.object(Vernacular, 'from_wikidata_match', return_value=[]):
+            for name in ['Libellula  luctuosa', 'libellula luctuosa']:
+                cache.clear_cache_for_function(vernacular._cached_from_match)
+                cached = Vernacular.from_match(name, use_cache = True)
+                uncached = Vernacular.from_match(name, use_cache = False)
+                self.assertTrue(any([vn.source == 'CDPNQ' for vn in cached]))
+                self.assertEqual([vars(vn) for vn in cached], [vars(vn) for vn in uncached])
+
     def test_match_english_cdpnq(self, name = 'Perimyotis subflavus'):
         result = Vernacular.from_cdpnq_match(name)
         self.assertTrue(any(item.language == 'eng' for item in result))
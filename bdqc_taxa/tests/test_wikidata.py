@@ -4,6 +4,8 @@ import unittest
 
 from bdqc_taxa import wikidata
 
+from . import setUpModule, tearDownModule  # noqa: F401
+
 # Test case : chiroptera, Q28425
 
 
@@ -31,6 +31,11 @@ setuptools.setup(
         'bdqc_taxa': ['../custom_sources.sqlite', 'custom_sources.sqlite']
     },
     python_requires=">=3.6",
+    entry_points={
+        'console_scripts': [
+            'bdqc-taxa-cache=bdqc_taxa.cache:main'
+        ]
+    },
     install_requires=[
         "psycopg2",
         "diskcache",
@@ -41,5 +46,13 @@ setuptools.setup(
             'pandas',
             'numpy'
         ],
+        'fast': [
+            'orjson',
+            'zstandard'
+        ],
+        'columns': [
+            'numpy',
+            'pyarrow'
+        ],
     }
 )
\ No newline at end of file